@@ -0,0 +1,278 @@
+import bisect
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+QUERIES_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (
+    1024, 10 * 1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024,
+)
+LABELS = ('view', 'method')
+UNRESOLVED_VIEW = 'unresolved'
+
+
+def _escape(value: str) -> str:
+    return (
+        str(value).replace('\\', '\\\\').replace('"', '\\"')
+        .replace('\n', '\\n')
+    )
+
+
+def _format_labels(names, values, **extra) -> str:
+    pairs = [*zip(names, values), *extra.items()]
+    if not pairs:
+        return ''
+    return '{' + ','.join(
+        f'{name}="{_escape(value)}"' for name, value in pairs
+    ) + '}'
+
+
+class Histogram:
+    """
+    Гистограмма в формате Prometheus: счётчики копятся с запуска
+    процесса, окна по времени считает сам Prometheus через rate().
+    """
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, buckets: tuple):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        # labels -> [счётчики по корзинам, сумма, количество]
+        self._series = defaultdict(
+            lambda: [[0] * (len(buckets) + 1), 0, 0]
+        )
+
+    def observe(self, labels: tuple, value) -> None:
+        series = self._series[labels]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket in zip((*self.buckets, '+Inf'), counts):
+                cumulative += bucket
+                yield (
+                    f'{self.name}_bucket'
+                    f'{_format_labels(LABELS, labels, le=bound)} {cumulative}'
+                )
+            yield f'{self.name}_sum{_format_labels(LABELS, labels)} {total}'
+            yield f'{self.name}_count{_format_labels(LABELS, labels)} {count}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: tuple):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._series = defaultdict(int)
+
+    def inc(self, labels: tuple, value: int = 1) -> None:
+        self._series[labels] += value
+
+    def render(self):
+        for labels, value in sorted(self._series.items()):
+            yield f'{self.name}{_format_labels(self.labels, labels)} {value}'
+
+
+class MetricsRegistry:
+    """Метрики запросов процесса, общие для всех потоков."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = Counter(
+            'foodgram_requests_total',
+            'Запросы по view, методу и статусу.',
+            (*LABELS, 'status'),
+        )
+        self.duration = Histogram(
+            'foodgram_request_duration_seconds',
+            'Время ответа целиком.',
+            DURATION_BUCKETS,
+        )
+        self.db_duration = Histogram(
+            'foodgram_request_db_seconds',
+            'Время SQL-запросов за один ответ.',
+            DURATION_BUCKETS,
+        )
+        self.app_duration = Histogram(
+            'foodgram_request_app_seconds',
+            'Время кода view и сериализаторов без SQL и рендеринга.',
+            DURATION_BUCKETS,
+        )
+        self.render_duration = Histogram(
+            'foodgram_request_render_seconds',
+            'Время рендеринга ответа.',
+            DURATION_BUCKETS,
+        )
+        self.queries = Histogram(
+            'foodgram_request_queries',
+            'Число SQL-запросов за один ответ.',
+            QUERIES_BUCKETS,
+        )
+        self.response_size = Histogram(
+            'foodgram_response_size_bytes',
+            'Размер ответа.',
+            SIZE_BUCKETS,
+        )
+
+    @property
+    def metrics(self) -> tuple:
+        return (
+            self.requests, self.duration, self.db_duration,
+            self.app_duration, self.render_duration, self.queries,
+            self.response_size,
+        )
+
+    def record(self, stats: 'RequestStats', status: int, size: int) -> None:
+        labels = (stats.view, stats.method)
+        with self._lock:
+            self.requests.inc((*labels, status))
+            self.duration.observe(labels, stats.total)
+            self.db_duration.observe(labels, stats.db)
+            self.app_duration.observe(labels, stats.app)
+            self.render_duration.observe(labels, stats.render)
+            self.queries.observe(labels, stats.queries)
+            self.response_size.observe(labels, size)
+
+    def render(self, extra=()) -> str:
+        """Все метрики в текстовом формате Prometheus."""
+        lines = []
+        with self._lock:
+            for metric in (*self.metrics, *extra):
+                lines.append(f'# HELP {metric.name} {metric.documentation}')
+                lines.append(f'# TYPE {metric.name} {metric.kind}')
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class RequestStats:
+    """Замеры одного запроса, время - в секундах."""
+    def __init__(self, method: str):
+        self.method = method
+        self.view = UNRESOLVED_VIEW
+        self.module = 'api'
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db = 0
+        self.render = 0
+        self.total = 0
+        self._render_started = None
+
+    @property
+    def app(self) -> float:
+        return max(self.total - self.db - self.render, 0)
+
+    @contextmanager
+    def capture_queries(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(self.execute_wrapper)
+                )
+            yield
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - started
+            self.queries += 1
+
+    def start_render(self) -> None:
+        self._render_started = time.perf_counter()
+
+    def finish_render(self, response) -> None:
+        self.render = time.perf_counter() - self._render_started
+
+    def finish(self, request) -> None:
+        self.total = time.perf_counter() - self.started
+        match = request.resolver_match
+        if match is not None:
+            self.view = match.view_name or match.url_name
+            self.module = match.func.__module__
+
+    def server_timing(self) -> str:
+        return ', '.join((
+            f'db;dur={self.db * 1000:.1f};desc="{self.queries} SQL"',
+            f'app;dur={self.app * 1000:.1f}',
+            f'render;dur={self.render * 1000:.1f}',
+            f'total;dur={self.total * 1000:.1f}',
+        ))
+
+    def log(self, status: int, size: int) -> None:
+        # recipes.metrics, user.metrics - в логгеры приложений из LOGGING.
+        app_name = self.module.split('.')[0]
+        logging.getLogger(f'{app_name}.metrics').info(
+            'view=%s method=%s status=%s queries=%s db_ms=%.1f '
+            'app_ms=%.1f render_ms=%.1f total_ms=%.1f bytes=%s',
+            self.view, self.method, status, self.queries, self.db * 1000,
+            self.app * 1000, self.render * 1000, self.total * 1000, size,
+        )
+
+
+class MetricsMiddleware:
+    """
+    Число и время SQL-запросов, время кода и рендеринга и размер
+    ответа по каждому view. Отдаёт их в заголовке Server-Timing,
+    пишет в лог и копит для /api/_metrics.
+    Включается переменной окружения API_METRICS=True.
+    """
+    def __init__(self, get_response):
+        if not settings.API_METRICS:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats(request.method)
+        request._metrics = stats
+        with stats.capture_queries():
+            response = self.get_response(request)
+        stats.finish(request)
+        response['Server-Timing'] = stats.server_timing()
+        if response.streaming:
+            # Файл собирается по ходу отдачи, замер - когда он отдан.
+            response.streaming_content = self._stream(
+                response.streaming_content, stats, request,
+                response.status_code,
+            )
+        else:
+            self._record(stats, response.status_code, len(response.content))
+        return response
+
+    def process_template_response(self, request, response):
+        stats = getattr(request, '_metrics', None)
+        if stats is not None:
+            stats.start_render()
+            response.add_post_render_callback(stats.finish_render)
+        return response
+
+    @staticmethod
+    def _record(stats: RequestStats, status: int, size: int) -> None:
+        registry.record(stats, status, size)
+        stats.log(status, size)
+
+    def _stream(self, chunks, stats: RequestStats, request, status: int):
+        size = 0
+        with stats.capture_queries():
+            for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+        stats.finish(request)
+        self._record(stats, status, size)
@@ -0,0 +1,100 @@
+import hashlib
+
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers
+)
+from django.utils.http import http_date, quote_etag
+
+PAGINATION_MODE_PARAM = 'pagination'
+CURSOR_PAGINATION_MODE = 'cursor'
+
+
+class CursorPaginationMixin:
+    """
+    По умолчанию работает pagination_class, а с ?pagination=cursor -
+    cursor_pagination_class, чтобы фронтенд с номерами страниц
+    продолжал работать.
+    """
+    cursor_pagination_class = None
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            pagination_class = self.pagination_class
+            if (
+                self.cursor_pagination_class is not None
+                and self.request.query_params.get(PAGINATION_MODE_PARAM)
+                == CURSOR_PAGINATION_MODE
+            ):
+                pagination_class = self.cursor_pagination_class
+            self._paginator = (
+                None if pagination_class is None else pagination_class()
+            )
+        return self._paginator
+
+
+class ConditionalGetMixin:
+    """
+    ETag и Last-Modified для list и retrieve.
+    get_conditional_stamp возвращает (части ETag, время изменения)
+    или None. Штамп считается после аутентификации, но до выборки и
+    сериализации: при совпадении с If-None-Match сразу отдаётся 304.
+    Last-Modified отдаётся, но If-Modified-Since не учитывается: у него
+    точность в секунду, и вторая правка в ту же секунду дала бы 304
+    с устаревшим ответом.
+    conditional_response оборачивает и другие обработчики.
+    vary_on_user - ответ зависит от пользователя (флаги is_favorited
+    и т.п.), такие ответы не должны попадать в общий кеш.
+    """
+    vary_on_user = False
+
+    def get_conditional_stamp(self, request, *args, **kwargs):
+        return None
+
+    def _get_etag(self, request, parts) -> str:
+        # Один и тот же ресурс в JSON и в browsable API - разные ответы.
+        parts = (
+            *parts,
+            request.get_full_path(),
+            request.accepted_renderer.format,
+        )
+        digest = hashlib.md5(
+            '|'.join(map(str, parts)).encode()
+        ).hexdigest()
+        return quote_etag(digest)
+
+    def _patch_headers(self, request, response, etag, last_modified):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(
+            response,
+            no_cache=True,
+            private=self.vary_on_user and request.user.is_authenticated,
+        )
+        if self.vary_on_user:
+            patch_vary_headers(response, ('Authorization', ))
+        return response
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        stamp = self.get_conditional_stamp(request, *args, **kwargs)
+        if stamp is None:
+            return handler(request, *args, **kwargs)
+        parts, last_modified = stamp
+        etag = self._get_etag(request, parts)
+        response = get_conditional_response(request._request, etag=etag)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        return self._patch_headers(request, response, etag, last_modified)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
@@ -1,5 +1,154 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 
 
 class CustomPaginator(PageNumberPagination):
     page_size_query_param = 'limit'
+
+
+class KeysetPaginator(BasePagination):
+    """
+    Курсорная пагинация по полям ordering без OFFSET и COUNT(*):
+    следующая страница выбирается условием по последней записи
+    предыдущей, поэтому время ответа не зависит от глубины.
+    Порядок, заданный фильтрами (?ordering=), сохраняется: курсор
+    строится по его полям. Если порядок задан выражением
+    (релевантность ?search=, доля ингредиентов ?have=), курсор
+    хранит смещение - такие выдачи ограничены RECIPE_SEARCH_LIMIT.
+    """
+    ordering = ('-id', )
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def get_page_size(self, request) -> int:
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return api_settings.PAGE_SIZE
+        return min(max(page_size, 1), self.max_page_size)
+
+    def _fields(self, queryset):
+        """
+        Поля порядка страниц: (имя, поле, по убыванию).
+        None - по такому порядку курсор не построить.
+        """
+        ordering = list(queryset.query.order_by) or list(self.ordering)
+        if not all(isinstance(name, str) for name in ordering):
+            return None
+        if 'id' not in {name.lstrip('-') for name in ordering}:
+            # Иначе записи с равными значениями терялись бы
+            # на границе страниц.
+            ordering.append('-id')
+        fields = []
+        for name in ordering:
+            try:
+                field = queryset.model._meta.get_field(name.lstrip('-'))
+            except FieldDoesNotExist:
+                return None
+            if not field.concrete or field.null:
+                return None
+            fields.append((field.attname, field, name.startswith('-')))
+        return fields
+
+    def _encode(self, value) -> str:
+        return base64.urlsafe_b64encode(
+            json.dumps(value).encode()
+        ).decode()
+
+    def _decode(self, cursor: str):
+        try:
+            return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, fields, instance) -> str:
+        return self._encode([
+            field.value_to_string(instance) for _, field, _ in fields
+        ])
+
+    def decode_cursor(self, fields, cursor: str) -> list:
+        values = self._decode(cursor)
+        try:
+            if not isinstance(values, list) or len(values) != len(fields):
+                raise ValueError
+            return [
+                field.to_python(value)
+                for (_, field, _), value in zip(fields, values)
+            ]
+        except (ValueError, TypeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def decode_offset(self, cursor: str) -> int:
+        value = self._decode(cursor)
+        offset = value.get('offset') if isinstance(value, dict) else None
+        if type(offset) is not int or offset < 0:
+            raise NotFound(self.invalid_cursor_message)
+        return offset
+
+    def _paginate_by_offset(self, queryset, page_size: int, cursor) -> list:
+        offset = self.decode_offset(cursor) if cursor else 0
+        page = list(queryset[offset:offset + page_size + 1])
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_cursor = self._encode({'offset': offset + page_size})
+        return page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.next_cursor = None
+        page_size = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        fields = self._fields(queryset)
+        if fields is None:
+            return self._paginate_by_offset(queryset, page_size, cursor)
+        if cursor:
+            condition = Q()
+            equal = Q()
+            values = self.decode_cursor(fields, cursor)
+            for (name, _, descending), value in zip(fields, values):
+                lookup = 'lt' if descending else 'gt'
+                condition |= equal & Q(**{f'{name}__{lookup}': value})
+                equal &= Q(**{name: value})
+            queryset = queryset.filter(condition)
+        page = list(queryset.order_by(*(
+            f'-{name}' if descending else name
+            for name, _, descending in fields
+        ))[:page_size + 1])
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_cursor = self.encode_cursor(fields, page[-1])
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.next_cursor,
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+
+class RecipeKeysetPaginator(KeysetPaginator):
+    ordering = ('-pub_date', '-id')
+
+
+class IdKeysetPaginator(KeysetPaginator):
+    ordering = ('id', )
@@ -1,6 +1,9 @@
 from django.urls import include, path
 
+from .views import MetricsView
+
 urlpatterns = [
+    path('api/_metrics', MetricsView.as_view(), name='metrics'),
     path('api/', include('recipes.urls')),
     path('api/', include('user.urls')),
 ]
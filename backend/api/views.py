@@ -0,0 +1,30 @@
+from django.http import HttpResponse
+from rest_framework import permissions
+from rest_framework.views import APIView
+
+from recipes.caching import get_cache_stats
+from .metrics import Counter, registry
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class MetricsView(APIView):
+    """
+    GET /api/_metrics - метрики процесса в формате Prometheus.
+    Только для staff. Замеры запросов копятся, если включён
+    MetricsMiddleware (API_METRICS=True).
+    """
+    permission_classes = (permissions.IsAdminUser, )
+
+    def get(self, request):
+        cart_cache = Counter(
+            'foodgram_shopping_cart_cache_total',
+            'Попадания и промахи кеша файлов списка покупок.',
+            ('result', ),
+        )
+        for name, value in get_cache_stats().items():
+            cart_cache.inc((name, ), value)
+        return HttpResponse(
+            registry.render(extra=(cart_cache, )),
+            content_type=PROMETHEUS_CONTENT_TYPE,
+        )
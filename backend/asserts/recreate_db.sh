@@ -16,6 +16,5 @@ echo "[++]Migrations complete."
 # password="DocLivesey!!!"
 # python backend/manage.py createsuperuser
 
-python adding_db_tags.py
-python adding_db_ingredients.py
+python ../manage.py load_catalog ../data/ingredients.json --tags
 python ../manage.py runserver
@@ -31,6 +31,8 @@ THIRD_PARTY_APPS = [
 INSTALLED_APPS = DJANGO_APPS + PROJECT_APPS + THIRD_PARTY_APPS
 
 MIDDLEWARE = [
+    # Первым, чтобы в замер попали и остальные middleware.
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -79,6 +81,22 @@ else:
         }
     }
 
+# Версии справочников, фрагменты рецептов и файлы списков покупок
+# должны быть общими для всех процессов, поэтому в проде - Redis.
+# LocMemCache по умолчанию годится для одного процесса, без DEBUG
+# о нём предупреждает проверка recipes.W001:
+# CACHE_BACKEND=django_redis.cache.RedisCache
+# CACHE_LOCATION=redis://cache:6379/1
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -138,7 +156,12 @@ LOGGING = {
             'handlers': ['console', ],
             'level': 'DEBUG',
             'propagate': True,
-        }
+        },
+        'api': {
+            'handlers': ['console', ],
+            'level': 'DEBUG',
+            'propagate': True,
+        },
     }
 }
 
@@ -161,6 +184,35 @@ DJOSER = {
 
 RECIPE_NAME_MAXLENGTH = 200
 
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+)
+SHOPPING_CART_CACHE_TIMEOUT = 60 * 60
+RECIPE_FRAGMENT_CACHE_TIMEOUT = 24 * 60 * 60
+SHOPPING_CART_CACHE_MAX_SIZE = 1024 * 1024
+
+INGREDIENT_SEARCH_LIMIT = 50
+# Сколько лучших по релевантности рецептов отдают ?search= и ?have=.
+RECIPE_SEARCH_LIMIT = 1000
+# Сколько рецептов можно добавить в избранное или корзину за раз.
+RECIPE_BULK_MAX_IDS = 100
+
+RECIPE_IMAGE_MAX_BYTES = 5 * 1024 * 1024
+# Тело JSON с картинкой в base64 (+1/3) и остальными полями рецепта,
+# иначе Django отклонит его раньше проверки размера картинки.
+DATA_UPLOAD_MAX_MEMORY_SIZE = RECIPE_IMAGE_MAX_BYTES * 4 // 3 + 1024 * 1024
+RECIPE_IMAGE_MAX_SIDE = 1600
+RECIPE_THUMBNAIL_SIDE = 480
+
+# Server-Timing, строки в логах recipes.metrics / user.metrics
+# и гистограммы для /api/_metrics.
+API_METRICS = os.getenv('API_METRICS') == 'True'
+
+# process | thread | sync (sync - выполнять сразу, для тестов).
+BACKGROUND_EXECUTOR = os.getenv('BACKGROUND_EXECUTOR', 'process')
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', 2))
+
 TAG_MODEL_SETTINGS = {
     'name_max_length': 200,
     'color_max_length': 7,
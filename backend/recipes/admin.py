@@ -48,19 +48,14 @@ class RecipeAdmin(admin.ModelAdmin):
         'name',
         'author',
         'pub_date',
-        'count',
+        'favorites_count',
+        'carts_count',
     )
     list_filter = ('name', )
     list_editable = ('name', )
     search_fields = ('name', 'author__username', 'tags__name')
     empty_value_display = '-пусто-'
-    readonly_fields = ('pub_date', )
-
-    def count(self, obj) -> int:
-        return obj.favorites.count()
-
-    count.short_description = 'В избранном'
-
+    readonly_fields = ('pub_date', 'favorites_count', 'carts_count')
     save_on_top = True
     inlines = (IngredientInline,)
     date_hierarchy = 'pub_date'
@@ -92,3 +87,15 @@ class ShoppingCartAdmin(admin.ModelAdmin):
         'user',
         'recipe',
     )
+
+
+@admin.register(models.ShoppingCartExport)
+class ShoppingCartExportAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'user',
+        'export_format',
+        'status',
+        'created',
+    )
+    list_filter = ('status', 'export_format')
@@ -6,3 +6,6 @@ class RecipesConfig(AppConfig):
     name = 'recipes'
 
     verbose_name = 'Рецепты'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
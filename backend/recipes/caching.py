@@ -0,0 +1,168 @@
+import time
+from itertools import chain
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+INGREDIENTS_VERSION_KEY = 'catalog:version:ingredients'
+TAGS_VERSION_KEY = 'catalog:version:tags'
+USER_FLAGS_VERSION_KEY = 'user:version:flags:{user_id}'
+RECIPE_INGREDIENTS_VERSION_KEY = 'catalog:version:recipe_ingredients'
+CHANGES_KEY = '{key}:changes:{version}'
+# Сколько версий назад процесс может догнать по журналу изменений.
+MAX_CHANGES = 100
+CHANGES_TIMEOUT = 60 * 60
+CART_VERSION_KEY = 'shopping_cart:version:{user_id}'
+CART_FILE_KEY = (
+    'shopping_cart:file:{user_id}:{version}:{catalog}:{export_format}'
+)
+STATS_KEY = 'shopping_cart:stats:{name}'
+RECIPE_FRAGMENT_KEY = (
+    'recipe:fragment:{serializer}:{recipe_id}:{version}:{base}'
+)
+STATS_NAMES = ('hits', 'misses')
+
+
+def get_version(key: str) -> int:
+    """
+    Текущая версия по ключу.
+    Начальное значение берётся от времени, чтобы после вытеснения ключа
+    из кеша версия не совпала ни с одной из прежних.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key: str) -> None:
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def log_changes(key: str, object_ids) -> None:
+    """
+    Поднимает версию и запоминает id изменённых объектов,
+    чтобы индексы в памяти обновлялись частично, а не целиком.
+    """
+    try:
+        version = cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+        return
+    cache.set(
+        CHANGES_KEY.format(key=key, version=version),
+        list(object_ids),
+        CHANGES_TIMEOUT,
+    )
+
+
+def log_changes_on_commit(key: str, object_ids) -> None:
+    # До коммита другие процессы прочитали бы из базы старые данные.
+    object_ids = list(object_ids)
+    transaction.on_commit(lambda: log_changes(key, object_ids))
+
+
+def get_changes(key: str, since: int, until: int):
+    """
+    Id объектов, изменённых между версиями since и until.
+    None - журнал неполон, индекс нужно пересобрать целиком.
+    """
+    if not 0 <= until - since <= MAX_CHANGES:
+        return None
+    keys = [
+        CHANGES_KEY.format(key=key, version=version)
+        for version in range(since + 1, until + 1)
+    ]
+    values = cache.get_many(keys)
+    if len(values) != len(keys):
+        return None
+    return set(chain.from_iterable(values.values()))
+
+
+def incr_stat(name: str) -> None:
+    key = STATS_KEY.format(name=name)
+    if not cache.add(key, 1, timeout=None):
+        cache.incr(key)
+
+
+def get_cache_stats() -> dict:
+    """Счётчики попаданий и промахов кеша списка покупок."""
+    values = cache.get_many(
+        [STATS_KEY.format(name=name) for name in STATS_NAMES]
+    )
+    return {
+        name: values.get(STATS_KEY.format(name=name), 0)
+        for name in STATS_NAMES
+    }
+
+
+def get_cart_file_key(user_id: int, export_format: str) -> str:
+    # Переименование ингредиента тоже меняет содержимое файла.
+    return CART_FILE_KEY.format(
+        user_id=user_id,
+        version=get_version(CART_VERSION_KEY.format(user_id=user_id)),
+        catalog=get_version(INGREDIENTS_VERSION_KEY),
+        export_format=export_format,
+    )
+
+
+def get_recipe_fragment_key(serializer: str, recipe, base: str) -> str:
+    """
+    Ключ общей для всех пользователей части рецепта.
+    Версия - updated_at, его сдвигают правки рецепта, справочников
+    и автора (см. signals.py). base - адрес сайта из ссылок на картинки.
+    """
+    return RECIPE_FRAGMENT_KEY.format(
+        serializer=serializer,
+        recipe_id=recipe.pk,
+        version=recipe.updated_at.timestamp(),
+        base=base,
+    )
+
+
+def bump_cart_versions(user_ids) -> None:
+    """Сбрасывает кеш файлов списка покупок у переданных пользователей."""
+    for user_id in set(user_ids):
+        bump_version(CART_VERSION_KEY.format(user_id=user_id))
+
+
+def get_user_flags_version(user_id: int) -> int:
+    return get_version(USER_FLAGS_VERSION_KEY.format(user_id=user_id))
+
+
+def bump_user_flags_version(user_id: int) -> None:
+    """Избранное, корзина или подписки пользователя изменились."""
+    bump_version(USER_FLAGS_VERSION_KEY.format(user_id=user_id))
+
+
+def bump_recipe_ingredients_version(recipe_ids) -> None:
+    """Сообщает индексу ?have=, у каких рецептов поменялся состав."""
+    log_changes_on_commit(RECIPE_INGREDIENTS_VERSION_KEY, recipe_ids)
+
+
+def cache_chunks(chunks, key: str):
+    """
+    Отдаёт части файла дальше и параллельно собирает их в кеш.
+    Файлы больше SHOPPING_CART_CACHE_MAX_SIZE не кешируются.
+    """
+    collected = []
+    size = 0
+    for chunk in chunks:
+        if collected is not None:
+            size += len(chunk)
+            if size > settings.SHOPPING_CART_CACHE_MAX_SIZE:
+                collected = None
+            else:
+                collected.append(chunk)
+        yield chunk
+    if collected is not None:
+        cache.set(
+            key,
+            b''.join(collected),
+            settings.SHOPPING_CART_CACHE_TIMEOUT,
+        )
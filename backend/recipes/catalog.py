@@ -0,0 +1,309 @@
+import bisect
+import threading
+from collections import defaultdict
+from fractions import Fraction
+
+from django.utils.module_loading import import_string
+
+from . import caching
+from .models import Ingredient, RecipeIngredient, Tag
+
+ITERATOR_CHUNK_SIZE = 5000
+
+
+def normalize(value: str) -> str:
+    """Регистронезависимый ключ поиска, ё приравнивается к е."""
+    return value.strip().casefold().replace('ё', 'е')
+
+
+class IngredientIndex:
+    """
+    Процессный индекс названий ингредиентов для автодополнения.
+    Строится при первом обращении и пересобирается, когда меняется
+    версия справочника ингредиентов (см. signals.py). Правки из других
+    процессов видны, только если кеш общий (см. checks.py).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        # Ключи и элементы подменяются одним присваиванием: search
+        # без блокировки не увидит ключи от одной сборки, а элементы
+        # от другой.
+        self._index = ([], [])
+
+    def _build(self) -> None:
+        # Элементы - уже сериализованные ингредиенты из ingredient_catalog.
+        rows = sorted(
+            (normalize(item['name']), item['id'], item)
+            for item in ingredient_catalog.items()
+        )
+        self._index = (
+            [key for key, _, _ in rows],
+            [item for _, _, item in rows],
+        )
+
+    def _ensure_fresh(self) -> None:
+        version = caching.get_version(caching.INGREDIENTS_VERSION_KEY)
+        if version == self._version:
+            return
+        with self._lock:
+            if version != self._version:
+                self._build()
+                self._version = version
+
+    def search(self, query: str, limit: int = None) -> list:
+        """
+        Ингредиенты, название которых начинается с query,
+        затем те, где query встречается в середине названия.
+        """
+        self._ensure_fresh()
+        query = normalize(query)
+        keys, items = self._index
+        result = []
+        start = bisect.bisect_left(keys, query)
+        end = start
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+        result.extend(items[start:end])
+        if limit is not None and len(result) >= limit:
+            return result[:limit]
+        for position, key in enumerate(keys):
+            if start <= position < end or query not in key:
+                continue
+            result.append(items[position])
+            if limit is not None and len(result) >= limit:
+                break
+        return result
+
+
+class SerializedCatalog:
+    """
+    Справочник, один раз прогнанный через сериализатор.
+    Хранится в процессе словарями {id: данные} и пересобирается,
+    когда меняется версия справочника (см. signals.py). Правки из
+    других процессов видны, только если кеш общий (см. checks.py).
+    Сериализатор задаётся путём: serializers.py сам импортирует catalog.
+    """
+    def __init__(self, model, serializer_path: str, version_key: str):
+        self.model = model
+        self.serializer_path = serializer_path
+        self.version_key = version_key
+        self._lock = threading.Lock()
+        self._version = None
+        self._items = {}
+
+    def _build(self) -> dict:
+        serializer_class = import_string(self.serializer_path)
+        return {
+            item['id']: item
+            for item in serializer_class(
+                self.model.objects.all(), many=True
+            ).data
+        }
+
+    def snapshot(self) -> dict:
+        """{id: сериализованный объект} в порядке Meta.ordering модели."""
+        version = caching.get_version(self.version_key)
+        if version == self._version:
+            return self._items
+        with self._lock:
+            if version != self._version:
+                self._items = self._build()
+                self._version = version
+        return self._items
+
+    def items(self) -> list:
+        return list(self.snapshot().values())
+
+
+def _bitmap(positions) -> int:
+    """Число, в котором выставлены биты с номерами из positions."""
+    positions = list(positions)
+    if not positions:
+        return 0
+    data = bytearray(max(positions) // 8 + 1)
+    for position in positions:
+        data[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(data, 'little')
+
+
+def _iter_bits(bitmap: int):
+    """Номера выставленных битов, начиная со старших."""
+    digits = bin(bitmap)
+    top = len(digits) - 1
+    position = digits.find('1', 2)
+    while position != -1:
+        yield top - position
+        position = digits.find('1', position + 1)
+
+
+class _CoverageState:
+    """
+    Снимок индекса. Не меняется после сборки: обновление собирает
+    новый снимок, поэтому читатели работают без блокировки.
+    """
+    def __init__(self, positions, recipe_ids, postings, totals):
+        # Рецепт - номер бита, ingredient_id и число ингредиентов - маски.
+        self.positions = positions
+        self.recipe_ids = recipe_ids
+        self.postings = postings
+        self.totals = totals
+
+
+class RecipeCoverageIndex:
+    """
+    Инвертированный индекс ингредиент -> рецепты для ?have=.
+    Для каждого ингредиента хранится битовая маска рецептов, для каждого
+    числа ингредиентов в рецепте - маска рецептов с таким числом.
+    Изменённые рецепты догружаются по журналу изменений (см. caching),
+    при пропусках в журнале индекс собирается заново. Журнал лежит
+    в кеше: между процессами он общий, только если общий кеш.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._state = _CoverageState({}, [], {}, {})
+
+    @staticmethod
+    def _rows(recipe_ids=None):
+        rows = RecipeIngredient.objects.order_by('recipe_id')
+        if recipe_ids is not None:
+            rows = rows.filter(recipe_id__in=recipe_ids)
+        return rows.values_list('recipe_id', 'ingredient_id').iterator(
+            chunk_size=ITERATOR_CHUNK_SIZE
+        )
+
+    @staticmethod
+    def _group(rows) -> dict:
+        recipes = defaultdict(list)
+        for recipe_id, ingredient_id in rows:
+            recipes[recipe_id].append(ingredient_id)
+        return recipes
+
+    def _build(self) -> _CoverageState:
+        recipes = self._group(self._rows())
+        recipe_ids = list(recipes)
+        positions = {
+            recipe_id: position
+            for position, recipe_id in enumerate(recipe_ids)
+        }
+        postings = defaultdict(list)
+        totals = defaultdict(list)
+        for position, ingredient_ids in enumerate(recipes.values()):
+            for ingredient_id in ingredient_ids:
+                postings[ingredient_id].append(position)
+            totals[len(ingredient_ids)].append(position)
+        return _CoverageState(
+            positions,
+            recipe_ids,
+            {key: _bitmap(value) for key, value in postings.items()},
+            {key: _bitmap(value) for key, value in totals.items()},
+        )
+
+    def _apply(self, state: _CoverageState, changed) -> _CoverageState:
+        """Новый снимок, где рецепты из changed перечитаны из базы."""
+        recipes = self._group(self._rows(changed))
+        positions = dict(state.positions)
+        recipe_ids = list(state.recipe_ids)
+        postings = dict(state.postings)
+        totals = dict(state.totals)
+        for recipe_id in changed:
+            if recipe_id not in positions:
+                positions[recipe_id] = len(recipe_ids)
+                recipe_ids.append(recipe_id)
+            bit = 1 << positions[recipe_id]
+            for masks in (postings, totals):
+                for key, mask in masks.items():
+                    if mask & bit:
+                        masks[key] = mask ^ bit
+            # Удалённый рецепт сохраняет номер бита, но не попадает в маски.
+            ingredient_ids = recipes.get(recipe_id, ())
+            for ingredient_id in ingredient_ids:
+                postings[ingredient_id] = postings.get(ingredient_id, 0) | bit
+            if ingredient_ids:
+                total = len(ingredient_ids)
+                totals[total] = totals.get(total, 0) | bit
+        return _CoverageState(positions, recipe_ids, postings, totals)
+
+    def _ensure_fresh(self) -> _CoverageState:
+        key = caching.RECIPE_INGREDIENTS_VERSION_KEY
+        version = caching.get_version(key)
+        if version == self._version:
+            return self._state
+        with self._lock:
+            if version != self._version:
+                changed = None
+                if self._version is not None:
+                    changed = caching.get_changes(
+                        key, self._version, version
+                    )
+                if changed is None:
+                    self._state = self._build()
+                else:
+                    self._state = self._apply(self._state, changed)
+                self._version = version
+        return self._state
+
+    def rank(self, ingredient_ids, limit: int) -> list:
+        """
+        Id рецептов, у которых есть хотя бы один ингредиент из
+        ingredient_ids, по убыванию доли имеющихся ингредиентов.
+        При равной доле выше рецепт, где совпало больше ингредиентов.
+        """
+        state = self._ensure_fresh()
+        masks = [
+            state.postings[ingredient_id]
+            for ingredient_id in set(ingredient_ids)
+            if ingredient_id in state.postings
+        ]
+        if not masks:
+            return []
+        # Побитовый счётчик: planes[i] - i-й бит числа совпадений рецепта.
+        planes = []
+        for mask in masks:
+            carry = mask
+            for number, plane in enumerate(planes):
+                planes[number] = plane ^ carry
+                carry &= plane
+                if not carry:
+                    break
+            if carry:
+                planes.append(carry)
+        every = (1 << len(state.recipe_ids)) - 1
+        matched = {}
+        for count in range(1, min(len(masks), (1 << len(planes)) - 1) + 1):
+            mask = every
+            for number, plane in enumerate(planes):
+                mask &= plane if count >> number & 1 else every ^ plane
+            if mask:
+                matched[count] = mask
+        result = []
+        for _, count, total in sorted(
+            (
+                (Fraction(count, total), count, total)
+                for total in state.totals
+                for count in matched
+                if count <= total
+            ),
+            reverse=True,
+        ):
+            mask = matched[count] & state.totals[total]
+            for position in _iter_bits(mask):
+                result.append(state.recipe_ids[position])
+                if len(result) >= limit:
+                    return result
+        return result
+
+
+ingredient_index = IngredientIndex()
+tag_catalog = SerializedCatalog(
+    Tag,
+    'recipes.serializers.TagSerializer',
+    caching.TAGS_VERSION_KEY,
+)
+ingredient_catalog = SerializedCatalog(
+    Ingredient,
+    'recipes.serializers.IngredientSerializer',
+    caching.INGREDIENTS_VERSION_KEY,
+)
+coverage_index = RecipeCoverageIndex()
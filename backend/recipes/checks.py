@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+LOCMEM_CACHE = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs) -> list:
+    """
+    Версии справочников, флагов пользователей и корзин лежат в кеше.
+    LocMemCache у каждого процесса свой: правка в одном воркере
+    не сбросит кеш и индексы в памяти других.
+    """
+    if settings.DEBUG or settings.CACHES['default']['BACKEND'] != (
+        LOCMEM_CACHE
+    ):
+        return []
+    return [Warning(
+        'Кеш по умолчанию - LocMemCache, он не общий для процессов.',
+        hint=(
+            'При нескольких воркерах задайте CACHE_BACKEND и '
+            'CACHE_LOCATION (например, Redis), иначе ответы и индексы '
+            'в памяти будут устаревать.'
+        ),
+        id='recipes.W001',
+    )]
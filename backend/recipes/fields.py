@@ -0,0 +1,108 @@
+import posixpath
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.storage import default_storage
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+from .images import (
+    Base64Image, ImageDecodeError, bound_image, check_image_size,
+    get_thumbnail_url
+)
+
+
+class Base64ImageField(serializers.ImageField):
+    """
+    Картинка в base64. Файл называется по хешу содержимого, если такой
+    файл уже есть в хранилище, возвращается его имя и запись пропускается.
+    allow_stored - принимать и имя уже загруженного файла из upload_to,
+    как его отдаёт выгрузка рецептов.
+    """
+    def __init__(
+        self, *args, upload_to='images/', allow_stored=False, **kwargs
+    ):
+        self.upload_to = upload_to
+        self.allow_stored = allow_stored
+        super().__init__(*args, **kwargs)
+
+    def _is_stored(self, data) -> bool:
+        return (
+            self.allow_stored
+            and isinstance(data, str)
+            and posixpath.dirname(data) == self.upload_to.rstrip('/')
+            and default_storage.exists(data)
+        )
+
+    def to_internal_value(self, data):
+        if self._is_stored(data):
+            return data
+        try:
+            if isinstance(data, str) and data.startswith('data:image'):
+                # Размер проверяется по длине строки, до декодирования.
+                image = Base64Image(data)
+                name = posixpath.join(self.upload_to, image.filename)
+                if default_storage.exists(name):
+                    return name
+                data = image.to_file()
+            elif getattr(data, 'size', None) is not None:
+                check_image_size(data.size)
+        except ImageDecodeError as error:
+            raise serializers.ValidationError(str(error))
+        return bound_image(super().to_internal_value(data))
+
+
+class ThumbnailImageField(serializers.ImageField):
+    """Отдаёт URL уменьшенной копии картинки для карточек."""
+    def to_representation(self, value):
+        if not value:
+            return None
+        url = get_thumbnail_url(value)
+        request = self.context.get('request', None)
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """Список id проверяется одним запросом, а не запросом на каждый id."""
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        return self.child_relation.to_internal_values(data)
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    С many=True получает все объекты одним запросом id__in
+    и сообщает сразу обо всех несуществующих id.
+    """
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+    def to_pk(self, data):
+        if self.pk_field is not None:
+            data = self.pk_field.to_internal_value(data)
+        try:
+            if isinstance(data, bool):
+                raise TypeError
+            return self.get_queryset().model._meta.pk.to_python(data)
+        except (TypeError, DjangoValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+    def to_internal_values(self, data) -> list:
+        pks = [self.to_pk(item) for item in data]
+        objects = self.get_queryset().in_bulk(set(pks))
+        missing = [pk for pk in dict.fromkeys(pks) if pk not in objects]
+        if missing:
+            raise serializers.ValidationError([
+                self.error_messages['does_not_exist'].format(pk_value=pk)
+                for pk in missing
+            ])
+        return [objects[pk] for pk in pks]
@@ -1,6 +1,15 @@
+from django.conf import settings
 from django_filters.rest_framework import FilterSet, filters
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+from rest_framework.settings import api_settings
 
+from .catalog import coverage_index, ingredient_index
 from .models import Recipe, Tag
+from .search import order_by_ids, search_recipes
+
+
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    pass
 
 
 class RecipeFilter(FilterSet):
@@ -15,6 +24,7 @@ class RecipeFilter(FilterSet):
         to_field_name='slug',
         queryset=Tag.objects.all()
     )
+    have = NumberInFilter(method='have_filter')
 
     class Meta:
         model = Recipe
@@ -31,3 +41,59 @@ class RecipeFilter(FilterSet):
         if value:
             return queryset.filter(shoppings__user=user)
         return queryset
+
+    def have_filter(self, queryset, name, value):
+        """
+        ?have=1,5,9 - рецепты из имеющихся ингредиентов:
+        выше те, где есть большая доля ингредиентов рецепта.
+        """
+        return order_by_ids(queryset, coverage_index.rank(
+            [int(ingredient_id) for ingredient_id in value],
+            settings.RECIPE_SEARCH_LIMIT,
+        ))
+
+
+class IngredientSearchFilter(BaseFilterBackend):
+    """
+    Поиск ингредиентов для автодополнения по индексу в памяти.
+    Сначала совпадения по началу названия, затем по вхождению.
+    Количество результатов ограничивается параметром ?limit=,
+    он приводится к диапазону от 1 до INGREDIENT_SEARCH_LIMIT.
+    """
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(api_settings.SEARCH_PARAM)
+        if not query or view.action != 'list':
+            return queryset
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+        try:
+            limit = max(min(int(request.query_params['limit']), limit), 1)
+        except (KeyError, ValueError):
+            pass
+        return ingredient_index.search(query, limit)
+
+
+class RecipeSearchFilter(BaseFilterBackend):
+    """
+    Полнотекстовый поиск рецептов по ?search=.
+    Ищет по названию, описанию и ингредиентам, выдача - по релевантности
+    среди RECIPE_SEARCH_LIMIT лучших совпадений.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip() or view.action != 'list':
+            return queryset
+        return search_recipes(queryset, query)
+
+
+class RecipeOrderingFilter(OrderingFilter):
+    """
+    Сортировка по ?ordering= с добавкой -id,
+    чтобы страницы при равных значениях не перемешивались.
+    """
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering and request.query_params.get(self.ordering_param):
+            return (*ordering, '-id')
+        return ordering
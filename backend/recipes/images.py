@@ -0,0 +1,147 @@
+import binascii
+import hashlib
+import io
+import logging
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.utils import timezone
+from django.utils.functional import cached_property
+from PIL import Image, ImageOps
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+# Кратно 4, чтобы каждый кусок base64 декодировался отдельно.
+DECODE_CHUNK_SIZE = 4 * 64 * 1024
+THUMBNAIL_SUFFIX = '_thumb'
+THUMBNAIL_FORMAT = 'WEBP'
+THUMBNAIL_EXTENSION = 'webp'
+THUMBNAIL_QUALITY = 80
+
+
+class ImageDecodeError(ValueError):
+    pass
+
+
+def check_image_size(size: int) -> None:
+    """Картинки больше RECIPE_IMAGE_MAX_BYTES не декодируем и не читаем."""
+    max_bytes = settings.RECIPE_IMAGE_MAX_BYTES
+    if size > max_bytes:
+        raise ImageDecodeError(
+            f'Размер картинки больше {max_bytes // (1024 * 1024)} МБ.'
+        )
+
+
+class Base64Image:
+    """
+    Картинка из data:image/...;base64.
+    Имя файла - sha256 содержимого, так одинаковые картинки
+    хранятся одним файлом.
+    """
+    def __init__(self, data: str):
+        header, _, self.imgstr = data.partition(';base64,')
+        self.content_type = header.partition(':')[2]
+        self.ext = header.split('/')[-1]
+        check_image_size(self.decoded_size)
+
+    @property
+    def decoded_size(self) -> int:
+        """Размер картинки после декодирования, считается по длине строки."""
+        padding = len(self.imgstr) - len(self.imgstr.rstrip('='))
+        return len(self.imgstr) * 3 // 4 - min(padding, 2)
+
+    def _iter_chunks(self):
+        """Декодирует base64 кусками, не собирая картинку в памяти."""
+        try:
+            for start in range(0, len(self.imgstr), DECODE_CHUNK_SIZE):
+                yield binascii.a2b_base64(
+                    self.imgstr[start:start + DECODE_CHUNK_SIZE]
+                )
+        except binascii.Error:
+            raise ImageDecodeError('Картинка должна быть в base64.')
+
+    @cached_property
+    def filename(self) -> str:
+        digest = hashlib.sha256()
+        for chunk in self._iter_chunks():
+            digest.update(chunk)
+        return f'{digest.hexdigest()}.{self.ext}'
+
+    def to_file(self) -> TemporaryUploadedFile:
+        """Декодированная картинка во временном файле на диске."""
+        file = TemporaryUploadedFile(
+            name=self.filename,
+            content_type=self.content_type,
+            size=0,
+            charset=None,
+        )
+        try:
+            for chunk in self._iter_chunks():
+                file.write(chunk)
+        except ImageDecodeError:
+            file.close()
+            raise
+        file.size = file.tell()
+        file.seek(0)
+        return file
+
+
+def bound_image(file):
+    """
+    Уменьшает картинку до RECIPE_IMAGE_MAX_SIDE по большей стороне.
+    Картинки в пределах размера возвращаются без перекодирования.
+    """
+    max_side = settings.RECIPE_IMAGE_MAX_SIDE
+    file.seek(0)
+    with Image.open(file) as image:
+        if max(image.size) <= max_side:
+            file.seek(0)
+            return file
+        image_format = image.format
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side))
+        output = io.BytesIO()
+        image.save(output, format=image_format)
+    file.close()
+    return ContentFile(output.getvalue(), name=file.name)
+
+
+def get_thumbnail_name(name: str) -> str:
+    root, _ = os.path.splitext(name)
+    return f'{root}{THUMBNAIL_SUFFIX}.{THUMBNAIL_EXTENSION}'
+
+
+def generate_variants(name: str) -> None:
+    """
+    Сохраняет рядом с оригиналом уменьшенную копию в WebP.
+    Запускается в фоне через tasks.submit.
+    Имя оригинала однозначно задаёт содержимое, поэтому готовую
+    копию не пересобираем.
+    """
+    thumbnail_name = get_thumbnail_name(name)
+    if default_storage.exists(thumbnail_name):
+        return
+    side = settings.RECIPE_THUMBNAIL_SIDE
+    with default_storage.open(name) as file, Image.open(file) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        image.thumbnail((side, side))
+        output = io.BytesIO()
+        image.save(output, format=THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY)
+    default_storage.save(thumbnail_name, ContentFile(output.getvalue()))
+    # В кеше фрагментов рецепты пока ссылаются на оригинал.
+    Recipe.objects.filter(image=name).update(updated_at=timezone.now())
+
+
+def get_thumbnail_url(image) -> str:
+    """URL уменьшенной копии, пока её нет - URL оригинала."""
+    thumbnail_name = get_thumbnail_name(image.name)
+    if default_storage.exists(thumbnail_name):
+        return default_storage.url(thumbnail_name)
+    return image.url
@@ -0,0 +1,189 @@
+import json
+import random
+import statistics
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from recipes.caching import bump_cart_versions
+from recipes.models import Recipe
+from user.models import CustomUser
+
+# cold_cart - перед каждым запросом сбрасывать кеш файла списка покупок.
+Endpoint = namedtuple(
+    'Endpoint', ('name', 'url', 'auth', 'cold_cart'), defaults=(False, False)
+)
+ENDPOINTS = (
+    Endpoint('recipes', '/api/recipes/'),
+    Endpoint('recipes page 50', '/api/recipes/?page=50'),
+    Endpoint('recipes cursor', '/api/recipes/?pagination=cursor'),
+    Endpoint('recipes tags', '/api/recipes/?tags=breakfast&tags=lunch'),
+    Endpoint('recipes user', '/api/recipes/', auth=True),
+    Endpoint('recipes favorited', '/api/recipes/?is_favorited=1', auth=True),
+    Endpoint(
+        'download_shopping_cart txt',
+        '/api/recipes/download_shopping_cart/?format=txt',
+        auth=True,
+    ),
+    Endpoint(
+        'download_shopping_cart txt cold',
+        '/api/recipes/download_shopping_cart/?format=txt',
+        auth=True,
+        cold_cart=True,
+    ),
+    Endpoint(
+        'download_shopping_cart pdf cold',
+        '/api/recipes/download_shopping_cart/?format=pdf',
+        auth=True,
+        cold_cart=True,
+    ),
+    Endpoint(
+        'subscriptions',
+        '/api/users/subscriptions/?recipes_limit=3',
+        auth=True,
+    ),
+)
+
+
+def percentile(values: list, percent: int) -> float:
+    if len(values) < 2:
+        return values[0]
+    return statistics.quantiles(
+        values, n=100, method='inclusive'
+    )[percent - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный замер API на данных из seed_bench через тестовый '
+        'клиент Django: перцентили времени ответа и число запросов к базе '
+        'по каждому адресу. Пользователи выбираются среди тех, у кого '
+        'есть корзина.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'endpoints', nargs='*',
+            help=(
+                'Замерить только эти адреса: '
+                + ', '.join(endpoint.name for endpoint in ENDPOINTS)
+            ),
+        )
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument(
+            '--users', type=int, default=20,
+            help='Сколько пользователей чередовать в запросах.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--output', help='Сохранить результаты в JSON-файл.',
+        )
+
+    def get_clients(self, count: int, random_seed: int) -> list:
+        user_ids = list(
+            CustomUser.objects.filter(
+                shoppings__isnull=False
+            ).distinct().values_list('id', flat=True)
+        )
+        if not user_ids:
+            raise CommandError('Нет пользователей с корзиной.')
+        user_ids = random.Random(random_seed).sample(
+            user_ids, min(count, len(user_ids))
+        )
+        clients = []
+        for user in CustomUser.objects.filter(id__in=user_ids):
+            client = APIClient()
+            client.force_authenticate(user)
+            clients.append((user, client))
+        return clients
+
+    def request(self, endpoint: Endpoint, user, client) -> dict:
+        if endpoint.cold_cart:
+            bump_cart_versions((user.id, ))
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.get(endpoint.url)
+            if response.streaming:
+                content = b''.join(response.streaming_content)
+            else:
+                content = response.content
+            elapsed = (time.perf_counter() - started) * 1000
+        if response.status_code != 200:
+            raise CommandError(
+                f'{endpoint.url}: {response.status_code} {content[:200]!r}'
+            )
+        return {
+            'ms': elapsed,
+            'queries': len(queries),
+            'bytes': len(content),
+        }
+
+    def measure(self, endpoint: Endpoint, clients: list, options) -> dict:
+        if not endpoint.auth:
+            clients = [(None, APIClient())]
+        for number in range(options['warmup']):
+            self.request(endpoint, *clients[number % len(clients)])
+        samples = [
+            self.request(endpoint, *clients[number % len(clients)])
+            for number in range(options['repeat'])
+        ]
+        timings = [sample['ms'] for sample in samples]
+        return {
+            'p50': percentile(timings, 50),
+            'p90': percentile(timings, 90),
+            'p99': percentile(timings, 99),
+            'max': max(timings),
+            'queries': statistics.median(
+                sample['queries'] for sample in samples
+            ),
+            'max_queries': max(sample['queries'] for sample in samples),
+            'bytes': statistics.median(sample['bytes'] for sample in samples),
+        }
+
+    def handle(self, *args, **options):
+        names = options['endpoints']
+        endpoints = [
+            endpoint for endpoint in ENDPOINTS
+            if not names or endpoint.name in names
+        ]
+        if not endpoints:
+            raise CommandError('Нет адресов с такими названиями.')
+        if not Recipe.objects.exists():
+            raise CommandError('База пуста, сначала запустите seed_bench.')
+        clients = self.get_clients(options['users'], options['seed'])
+        self.stdout.write(
+            f'{"адрес":<34}{"p50":>9}{"p90":>9}{"p99":>9}{"max":>9}'
+            f'{"запросы":>9}{"байт":>9}'
+        )
+        results = {}
+        # Тестовый клиент ходит на testserver.
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']
+        ):
+            for endpoint in endpoints:
+                result = self.measure(endpoint, clients, options)
+                results[endpoint.name] = result
+                self.stdout.write(
+                    f'{endpoint.name:<34}'
+                    f'{result["p50"]:>9.1f}{result["p90"]:>9.1f}'
+                    f'{result["p99"]:>9.1f}{result["max"]:>9.1f}'
+                    f'{result["queries"]:>9g}{result["bytes"]:>9g}'
+                )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(
+                    {
+                        'options': {
+                            key: options[key]
+                            for key in ('repeat', 'warmup', 'users', 'seed')
+                        },
+                        'results': results,
+                    },
+                    file, ensure_ascii=False, indent=2,
+                )
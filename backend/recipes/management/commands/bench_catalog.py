@@ -0,0 +1,97 @@
+import statistics
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from recipes.catalog import ingredient_catalog, tag_catalog
+from recipes.management.seed import ensure_catalog, seed
+from recipes.models import Ingredient, Recipe
+from recipes.serializers import (
+    IngredientSerializer, RecipeListSerializer, TagSerializer
+)
+
+
+class UncachedListSerializer(RecipeListSerializer):
+    """Рецепт собирается заново на каждый вызов."""
+    cache_fragments = False
+
+
+class NestedTagsSerializer(UncachedListSerializer):
+    """Прежний вариант: теги через вложенный TagSerializer."""
+    tags = TagSerializer(many=True, read_only=True)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает сериализацию страницы рецептов и списка ингредиентов '
+        'с кешем справочников и фрагментов рецептов и без них. '
+        'Данные откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--page-size', type=int, default=6)
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def compare(self, title: str, before, after, repeat: int) -> None:
+        # Варианты чередуются, чтобы дрейф машины делился между ними.
+        timings = {before: [], after: []}
+        for _ in range(repeat):
+            for func, results in timings.items():
+                started = time.perf_counter()
+                func()
+                results.append((time.perf_counter() - started) * 1000)
+        before, after = (
+            statistics.median(results) for results in timings.values()
+        )
+        self.stdout.write(
+            f'{title}: {before:.3f} мс -> {after:.3f} мс, '
+            f'экономия {before - after:.3f} мс'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            ensure_catalog(options['ingredients'])
+            seed(users=50, recipes=options['recipes'])
+            request = Request(APIRequestFactory().get('/api/recipes/'))
+            request.user = AnonymousUser()
+            context = {'request': request}
+            # Страница выбирается заранее, сравнивается только сериализация.
+            page = list(
+                Recipe.objects.with_related()[:options['page_size']]
+            )
+            tag_catalog.snapshot()
+            ingredient_catalog.snapshot()
+            self.compare(
+                f'Страница из {len(page)} рецептов',
+                lambda: NestedTagsSerializer(
+                    page, many=True, context=context
+                ).data,
+                lambda: UncachedListSerializer(
+                    page, many=True, context=context
+                ).data,
+                options['repeat'],
+            )
+            self.compare(
+                f'Страница из {len(page)} рецептов, кеш фрагментов',
+                lambda: UncachedListSerializer(
+                    page, many=True, context=context
+                ).data,
+                lambda: RecipeListSerializer(
+                    page, many=True, context=context
+                ).data,
+                options['repeat'],
+            )
+            ingredients = list(Ingredient.objects.all())
+            self.compare(
+                f'Список из {len(ingredients)} ингредиентов',
+                lambda: IngredientSerializer(ingredients, many=True).data,
+                ingredient_catalog.items,
+                options['repeat'],
+            )
+            transaction.set_rollback(True)
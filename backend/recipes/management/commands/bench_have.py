@@ -0,0 +1,85 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Q
+from django.db.models.functions import Cast
+
+from recipes.catalog import RecipeCoverageIndex
+from recipes.management.seed import seed
+from recipes.models import Ingredient, Recipe
+
+LIMIT = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает ранжирование ?have= по индексу в памяти с GROUP BY '
+        'по всему составу рецептов. Данные откатываются после запуска.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--have', type=int, default=5)
+
+    def measure(self, func, repeat: int) -> list:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    def report(self, title: str, timings: list) -> None:
+        self.stdout.write(
+            f'{title}: медиана {statistics.median(timings):.1f} мс, '
+            f'максимум {max(timings):.1f} мс'
+        )
+
+    def group_by(self, have: list) -> list:
+        return list(Recipe.objects.annotate(
+            matched=Count(
+                'ingredients_used',
+                filter=Q(ingredients_used__ingredient__in=have),
+            ),
+            total=Count('ingredients_used'),
+        ).filter(matched__gt=0).order_by(
+            -Cast(F('matched'), FloatField()) / F('total'),
+            '-matched',
+        ).values_list('pk', flat=True)[:LIMIT])
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            counts = seed(users=options['users'], recipes=options['recipes'])
+            self.stdout.write(f'Сгенерировано: {counts}')
+            ingredient_ids = list(
+                Ingredient.objects.values_list('pk', flat=True)
+            )
+            have = random.Random(0).sample(
+                ingredient_ids, min(options['have'], len(ingredient_ids))
+            )
+            index = RecipeCoverageIndex()
+            self.report('Сборка индекса', self.measure(index._build, 1))
+            index.rank(have, LIMIT)
+            self.report(
+                f'Индекс, have={have}',
+                self.measure(
+                    lambda: index.rank(have, LIMIT), options['repeat']
+                ),
+            )
+            changed = set(range(1, 101))
+            self.report(
+                'Обновление 100 рецептов',
+                self.measure(
+                    lambda: index._apply(index._state, changed), 1
+                ),
+            )
+            self.report(
+                'GROUP BY по составу',
+                self.measure(lambda: self.group_by(have), 3),
+            )
+            transaction.set_rollback(True)
@@ -0,0 +1,58 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.management.seed import WORDS, seed
+from recipes.models import Recipe
+from recipes.search import search_recipes
+
+DEFAULT_QUERIES = (
+    'борщ',
+    'острый суп',
+    'куриный пирог',
+    'гуляш домашний',
+    'сырн',
+)
+PAGE_SIZE = 6
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет полнотекстовый поиск рецептов на синтетических данных. '
+        'Данные откатываются после запуска.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument(
+            'queries', nargs='*', default=DEFAULT_QUERIES,
+            help=f'Поисковые запросы, слова для названий: {", ".join(WORDS)}',
+        )
+
+    def measure(self, query: str, repeat: int) -> list:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(search_recipes(Recipe.objects.all(), query)[:PAGE_SIZE])
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            started = time.perf_counter()
+            counts = seed(users=options['users'], recipes=options['recipes'])
+            self.stdout.write(
+                f'Сгенерировано за {time.perf_counter() - started:.1f} с: '
+                f'{counts}'
+            )
+            for query in options['queries']:
+                timings = self.measure(query, options['repeat'])
+                self.stdout.write(
+                    f'{query!r}: медиана {statistics.median(timings):.1f} мс, '
+                    f'максимум {max(timings):.1f} мс'
+                )
+            transaction.set_rollback(True)
@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.models import ShoppingCartExport
+
+EXPORTS_DIR = 'exports'
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет фоновые выгрузки списка покупок старше --max-age часов '
+        'и файлы в media/exports, на которые не ссылается ни одна '
+        'выгрузка.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет удалено.',
+        )
+        parser.add_argument(
+            '--max-age',
+            type=int,
+            default=24,
+            help=(
+                'Сколько часов хранить выгрузку: за это время клиент '
+                'успевает её забрать.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        threshold = timezone.now() - timedelta(hours=options['max_age'])
+        expired = ShoppingCartExport.objects.filter(created__lt=threshold)
+        referenced = set(
+            ShoppingCartExport.objects.filter(
+                created__gte=threshold
+            ).exclude(file='').exclude(
+                file__isnull=True
+            ).values_list('file', flat=True)
+        )
+        try:
+            _, files = default_storage.listdir(EXPORTS_DIR)
+        except FileNotFoundError:
+            files = []
+        removed = 0
+        freed = 0
+        for filename in files:
+            name = f'{EXPORTS_DIR}/{filename}'
+            if name in referenced:
+                continue
+            # Файл свежей выгрузки мог записаться раньше её строки.
+            if default_storage.get_modified_time(name) > threshold:
+                continue
+            freed += default_storage.size(name)
+            removed += 1
+            if options['dry_run']:
+                self.stdout.write(name)
+            else:
+                default_storage.delete(name)
+        if options['dry_run']:
+            exports = expired.count()
+        else:
+            exports, _ = expired.delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Старых выгрузок: {exports}, файлов: {removed}, '
+            f'{freed // 1024} КБ.'
+        ))
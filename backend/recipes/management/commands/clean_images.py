@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.images import get_thumbnail_name
+from recipes.models import Recipe
+
+IMAGES_DIR = 'images'
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет из media/images картинки и их уменьшенные копии, '
+        'на которые не ссылается ни один рецепт.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет удалено.',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=60,
+            help=(
+                'Не трогать файлы моложе стольких минут: картинка могла '
+                'сохраниться, а рецепт ещё нет.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        referenced = set()
+        for name in Recipe.objects.exclude(image='').exclude(
+            image__isnull=True
+        ).values_list('image', flat=True).iterator():
+            referenced.add(name)
+            referenced.add(get_thumbnail_name(name))
+        threshold = timezone.now() - timedelta(minutes=options['min_age'])
+        _, files = default_storage.listdir(IMAGES_DIR)
+        removed = 0
+        freed = 0
+        for filename in files:
+            name = f'{IMAGES_DIR}/{filename}'
+            if name in referenced:
+                continue
+            if default_storage.get_modified_time(name) > threshold:
+                continue
+            freed += default_storage.size(name)
+            removed += 1
+            if options['dry_run']:
+                self.stdout.write(name)
+            else:
+                default_storage.delete(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Файлов без рецептов: {removed}, {freed // 1024} КБ.'
+        ))
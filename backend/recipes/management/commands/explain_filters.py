@@ -0,0 +1,90 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from recipes.management.seed import seed
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart
+from user.models import CustomUser
+
+INDEXED_MODELS = (Recipe, Favorite, ShoppingCart)
+POSTGRES_INDEXES = (
+    'ingredient_name_pattern_idx',
+    'ingredient_name_trgm_idx',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает планы запросов RecipeFilter без индексов и с ними '
+        'на синтетических данных. Данные откатываются после запуска.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--recipes', type=int, default=20000)
+
+    def get_queries(self) -> dict:
+        user = CustomUser.objects.filter(favorites__isnull=False).first()
+        return {
+            'Лента рецептов': Recipe.objects.all()[:6],
+            'Фильтр по тегу': Recipe.objects.filter(
+                tags__slug='breakfast'
+            )[:6],
+            'Фильтр по автору': Recipe.objects.filter(author=user)[:6],
+            'Избранное': Recipe.objects.filter(favorites__user=user)[:6],
+            'Список покупок': Recipe.objects.filter(
+                shoppings__user=user
+            )[:6],
+            'Флаги избранного и корзины': (
+                Recipe.objects.with_user_flags(user)[:6]
+            ),
+            'Поиск ингредиента': Ingredient.objects.filter(
+                name__istartswith='кар'
+            ),
+        }
+
+    def drop_indexes(self) -> None:
+        names = [
+            index.name
+            for model in INDEXED_MODELS
+            for index in model._meta.indexes
+        ]
+        if connection.vendor == 'postgresql':
+            names.extend(POSTGRES_INDEXES)
+        with connection.cursor() as cursor:
+            for name in names:
+                cursor.execute(
+                    f'DROP INDEX IF EXISTS {connection.ops.quote_name(name)}'
+                )
+
+    def analyze(self) -> None:
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def explain(self) -> dict:
+        return {
+            title: queryset.explain()
+            for title, queryset in self.get_queries().items()
+        }
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            counts = seed(users=options['users'], recipes=options['recipes'])
+            self.stdout.write(f'Сгенерировано: {counts}')
+            self.analyze()
+            with transaction.atomic():
+                self.drop_indexes()
+                self.analyze()
+                before = self.explain()
+                transaction.set_rollback(True)
+            self.analyze()
+            after = self.explain()
+            transaction.set_rollback(True)
+        for title in before:
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            for label, plans in (
+                ('без индексов', before),
+                ('с индексами', after),
+            ):
+                self.stdout.write(f'  {label}:')
+                for line in plans[title].splitlines():
+                    self.stdout.write(f'    {line}')
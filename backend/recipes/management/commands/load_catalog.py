@@ -0,0 +1,76 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.management.loader import (
+    BATCH_SIZE, FORMATS, load_ingredients, load_tags, read_rows,
+    synthetic_rows
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает справочник ингредиентов из JSON или CSV пачками. '
+        'Ингредиенты, которые уже есть в базе, пропускаются, поэтому '
+        'команду можно запускать повторно.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=os.path.join(
+                settings.BASE_DIR, 'data', 'ingredients.json'
+            ),
+        )
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='Формат файла, по умолчанию - по расширению.',
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--tags',
+            action='store_true',
+            help='Добавить и теги по умолчанию.',
+        )
+        parser.add_argument(
+            '--synthetic',
+            type=int,
+            metavar='N',
+            help='Вместо файла загрузить N сгенерированных ингредиентов.',
+        )
+
+    def handle(self, *args, **options):
+        if options['tags']:
+            self.stdout.write(f'Добавлено тегов: {load_tags()}')
+        started = time.perf_counter()
+        if options['synthetic']:
+            stats = self.load(synthetic_rows(options['synthetic']), options)
+        else:
+            path = options['path']
+            file_format = (
+                options['format'] or os.path.splitext(path)[1].lstrip('.')
+            )
+            if file_format not in FORMATS:
+                raise CommandError(
+                    f'Неизвестный формат файла: {file_format}.'
+                )
+            try:
+                with open(path, encoding='utf-8', newline='') as file:
+                    stats = self.load(read_rows(file, file_format), options)
+            except OSError as error:
+                raise CommandError(error)
+            except (KeyError, IndexError, ValueError) as error:
+                raise CommandError(f'Ошибка в файле {path}: {error!r}')
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'Прочитано строк: {stats["read"]}, '
+            f'добавлено ингредиентов: {stats["created"]}, '
+            f'за {elapsed:.2f} с ({stats["read"] / elapsed:.0f} строк/с)'
+        )
+
+    def load(self, rows, options) -> dict:
+        return load_ingredients(rows, batch_size=options['batch_size'])
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет счётчики favorites_count и carts_count рецептов '
+        'с избранным и корзинами и исправляет расхождения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, сколько счётчиков разошлось.',
+        )
+
+    def handle(self, *args, **options):
+        repaired = Recipe.objects.repair_counters(options['dry_run'])
+        verb = 'Разошлось' if options['dry_run'] else 'Исправлено'
+        for field, count in repaired.items():
+            self.stdout.write(f'{verb} {field}: {count}')
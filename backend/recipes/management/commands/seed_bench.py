@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.management.seed import ensure_catalog, seed
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, рецептами, '
+        'избранным, корзинами и подписками для bench_api. '
+        'Популярность авторов и рецептов - по закону Ципфа.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Среднее число рецептов в избранном у пользователя.',
+        )
+        parser.add_argument(
+            '--carts', type=int, default=5,
+            help='Среднее число рецептов в корзине у пользователя.',
+        )
+        parser.add_argument(
+            '--subscriptions', type=int, default=10,
+            help='Среднее число подписок у пользователя.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            ensure_catalog(options['ingredients'])
+            counts = seed(
+                users=options['users'],
+                recipes=options['recipes'],
+                favorites=options['favorites'],
+                carts=options['carts'],
+                subscriptions=options['subscriptions'],
+                random_seed=options['seed'],
+            )
+        self.stdout.write(
+            f'Сгенерировано за {time.perf_counter() - started:.1f} с: '
+            f'{counts}'
+        )
@@ -0,0 +1,195 @@
+"""Потоковая загрузка справочника ингредиентов из JSON и CSV."""
+import csv
+import io
+import json
+import re
+from itertools import islice
+
+from django.db import connection, transaction
+
+from recipes import caching
+from recipes.models import Ingredient, Tag
+
+DEFAULT_TAGS = (
+    ('Завтрак', '#DAA520', 'breakfast'),
+    ('Обед', '#3CB371', 'dinner'),
+    ('Ужин', '#FA8072', 'lunch'),
+    ('Ночной дожор', '#000000', 'junkfood'),
+)
+FORMATS = ('json', 'csv')
+BATCH_SIZE = 5000
+READ_CHUNK_SIZE = 64 * 1024
+SYNTHETIC_UNITS = ('г', 'кг', 'мл', 'л', 'шт.', 'ст. л.', 'ч. л.')
+_SEPARATORS = re.compile(r'[\s,]*')
+
+
+def iter_json(file):
+    """
+    Объекты из JSON-массива по одному, файл читается кусками
+    и целиком в памяти не держится.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    opened = False
+    while True:
+        chunk = file.read(READ_CHUNK_SIZE)
+        buffer += chunk
+        position = 0
+        while True:
+            position = _SEPARATORS.match(buffer, position).end()
+            if position == len(buffer) or buffer[position] == ']':
+                break
+            if not opened:
+                if buffer[position] != '[':
+                    raise ValueError('Ожидался JSON-массив.')
+                opened = True
+                position += 1
+                continue
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                # Объект разрезан границей куска, дочитываем файл.
+                break
+            yield item
+        buffer = buffer[position:]
+        if not chunk:
+            return
+
+
+def read_rows(file, file_format: str):
+    """Пары (название, единица измерения) из файла."""
+    if file_format == 'json':
+        for item in iter_json(file):
+            yield item['name'], item['measurement_unit']
+        return
+    for row in csv.reader(file):
+        if row and row != ['name', 'measurement_unit']:
+            yield row[0], row[1]
+
+
+def synthetic_rows(count: int):
+    """Сгенерированный справочник для проверки скорости загрузки."""
+    for number in range(count):
+        yield (
+            f'синтетический ингредиент {number}',
+            SYNTHETIC_UNITS[number % len(SYNTHETIC_UNITS)],
+        )
+
+
+def _clean(rows, stats: dict):
+    for name, measurement_unit in rows:
+        stats['read'] += 1
+        name, measurement_unit = name.strip(), measurement_unit.strip()
+        if name and measurement_unit:
+            yield name, measurement_unit
+
+
+def _insert_batches(rows, batch_size: int) -> None:
+    """
+    Пачки через executemany: bulk_create тратит почти всё время
+    на создание моделей и сборку SQL, а поля здесь - две строки.
+    """
+    ops = connection.ops
+    sql = (
+        f'{ops.insert_statement(ignore_conflicts=True)} '
+        f'{ops.quote_name(Ingredient._meta.db_table)} '
+        '(name, measurement_unit) VALUES (%s, %s)'
+        f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}'
+    )
+    rows = iter(rows)
+    with connection.cursor() as cursor:
+        while True:
+            # dict.fromkeys убирает дубли внутри пачки, между пачками и
+            # с уже загруженными строками их отсекает уникальный индекс.
+            batch = list(dict.fromkeys(islice(rows, batch_size)))
+            if not batch:
+                return
+            cursor.executemany(sql, batch)
+
+
+class _CSVStream:
+    """Файл для COPY: строки переводятся в CSV по мере чтения."""
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+        self._pending = ''
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._pending) < size:
+            batch = list(islice(self._rows, 1000))
+            if not batch:
+                break
+            self._writer.writerows(batch)
+            self._pending += self._buffer.getvalue()
+            self._buffer.seek(0)
+            self._buffer.truncate()
+        if size < 0:
+            size = len(self._pending)
+        result, self._pending = self._pending[:size], self._pending[size:]
+        return result
+
+
+def _copy(rows) -> None:
+    """
+    PostgreSQL: COPY во временную таблицу и одна вставка оттуда,
+    дубли отсекает ON CONFLICT DO NOTHING.
+    """
+    table = connection.ops.quote_name(Ingredient._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMP TABLE ingredient_load '
+            '(name text, measurement_unit text) ON COMMIT DROP'
+        )
+        cursor.copy_expert(
+            'COPY ingredient_load FROM STDIN WITH (FORMAT csv)',
+            _CSVStream(rows),
+        )
+        cursor.execute(
+            f'INSERT INTO {table} (name, measurement_unit) '
+            'SELECT DISTINCT name, measurement_unit FROM ingredient_load '
+            'ON CONFLICT DO NOTHING'
+        )
+
+
+@transaction.atomic
+def load_ingredients(rows, batch_size: int = BATCH_SIZE) -> dict:
+    """
+    Добавляет ингредиенты, которых ещё нет в базе.
+    Совпадение - по паре (название, единица измерения), поэтому
+    повторная загрузка того же файла ничего не меняет.
+    В PostgreSQL строки идут через COPY, в остальных базах - пачками.
+    """
+    stats = {'read': 0}
+    before = Ingredient.objects.count()
+    if connection.vendor == 'postgresql':
+        _copy(_clean(rows, stats))
+    else:
+        _insert_batches(_clean(rows, stats), batch_size)
+    stats['created'] = Ingredient.objects.count() - before
+    if stats['created']:
+        # Загрузка идёт мимо моделей, сигналов не будет.
+        transaction.on_commit(lambda: caching.bump_version(
+            caching.INGREDIENTS_VERSION_KEY
+        ))
+    return stats
+
+
+def load_tags() -> int:
+    """Теги по умолчанию, уже существующие слаги пропускаются."""
+    before = Tag.objects.count()
+    Tag.objects.bulk_create(
+        [
+            Tag(name=name, color=color, slug=slug)
+            for name, color, slug in DEFAULT_TAGS
+        ],
+        ignore_conflicts=True,
+    )
+    created = Tag.objects.count() - before
+    if created:
+        transaction.on_commit(lambda: caching.bump_version(
+            caching.TAGS_VERSION_KEY
+        ))
+    return created
@@ -0,0 +1,217 @@
+"""Генерация синтетических данных для бенчмарков."""
+import random
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from recipes import caching
+from recipes.management.loader import load_tags
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart, Tag
+)
+from recipes.search import update_search_index
+from user.models import CustomUser
+
+WORDS = (
+    'суп', 'салат', 'пирог', 'запеканка', 'каша', 'рагу', 'паста',
+    'котлеты', 'блины', 'омлет', 'плов', 'борщ', 'гуляш', 'десерт',
+    'домашний', 'быстрый', 'острый', 'сырный', 'овощной', 'куриный',
+)
+# Слова описаний: частые в начале, названия блюд в длинном хвосте.
+TEXT_WORDS = (
+    'и', 'в', 'на', 'до', 'минут', 'добавить', 'нарезать', 'посолить',
+    'перемешать', 'готовности', 'масло', 'соль', 'перец', 'вода', 'огонь',
+    'сковорода', 'кастрюля', 'духовка', 'обжарить', 'варить', 'тушить',
+    'запекать', 'подавать', 'горячим', 'холодным', 'зелень', 'лук',
+    'морковь', 'чеснок', 'сметана', 'мука', 'яйца', 'молоко', 'сахар',
+    'кубиками', 'соломкой', 'кольцами', 'крупно', 'мелко', 'слегка',
+) + WORDS
+MIN_INGREDIENTS = 3
+MAX_INGREDIENTS = 15
+DAYS_SPREAD = 3 * 365
+BATCH_SIZE = 2000
+
+
+@contextmanager
+def _manual_pub_date():
+    """Отключает auto_now_add, чтобы даты публикации были разными."""
+    field = Recipe._meta.get_field('pub_date')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def _next_id(model) -> int:
+    last = model.objects.order_by('-pk').values_list('pk', flat=True).first()
+    return (last or 0) + 1
+
+
+def _zipf_weights(size: int) -> list:
+    """Веса с длинным хвостом: немногие авторы и рецепты популярнее всех."""
+    return [1 / (rank + 1) for rank in range(size)]
+
+
+def _sample_distinct(population, weights, count, rnd) -> set:
+    count = min(count, len(population))
+    result = set()
+    while len(result) < count:
+        result.update(rnd.choices(population, weights, k=count - len(result)))
+    return result
+
+
+def _bulk_create(model, objects) -> None:
+    model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+
+
+def _reset_sequences(*models) -> None:
+    """После вставки с явными id сдвигаем последовательности Postgres."""
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
+
+
+def ensure_catalog(ingredients: int = 0) -> tuple:
+    """Теги по умолчанию и не меньше ingredients ингредиентов в базе."""
+    load_tags()
+    missing = ingredients - Ingredient.objects.count()
+    if missing > 0:
+        start = _next_id(Ingredient)
+        _bulk_create(Ingredient, [
+            Ingredient(
+                pk=start + number,
+                name=f'ингредиент {start + number}',
+                measurement_unit='г',
+            )
+            for number in range(missing)
+        ])
+        _reset_sequences(Ingredient)
+        transaction.on_commit(lambda: caching.bump_version(
+            caching.INGREDIENTS_VERSION_KEY
+        ))
+    return (
+        list(Tag.objects.values_list('pk', flat=True)),
+        list(Ingredient.objects.values_list('pk', flat=True)),
+    )
+
+
+@transaction.atomic
+def seed(
+    users: int = 100,
+    recipes: int = 1000,
+    favorites: int = 20,
+    carts: int = 5,
+    subscriptions: int = 10,
+    random_seed: int = 0,
+) -> dict:
+    """
+    Создаёт пользователей, рецепты, избранное, корзины и подписки
+    пачками через bulk_create.
+    favorites, carts и subscriptions - среднее количество на пользователя.
+    """
+    rnd = random.Random(random_seed)
+    tag_ids, ingredient_ids = ensure_catalog(MAX_INGREDIENTS)
+
+    user_start = _next_id(CustomUser)
+    password = make_password('benchmark')
+    _bulk_create(CustomUser, [
+        CustomUser(
+            pk=user_start + number,
+            email=f'bench{user_start + number}@example.com',
+            username=f'bench{user_start + number}',
+            first_name='Бенч',
+            last_name=f'Пользователь {number}',
+            password=password,
+        )
+        for number in range(users)
+    ])
+    user_ids = list(range(user_start, user_start + users))
+    author_weights = _zipf_weights(users)
+    text_weights = _zipf_weights(len(TEXT_WORDS))
+
+    recipe_start = _next_id(Recipe)
+    recipe_ids = list(range(recipe_start, recipe_start + recipes))
+    today = date.today()
+    with _manual_pub_date():
+        _bulk_create(Recipe, [
+            Recipe(
+                pk=recipe_id,
+                author_id=rnd.choices(user_ids, author_weights)[0],
+                name=' '.join(rnd.sample(WORDS, 3)).capitalize(),
+                text=' '.join(rnd.choices(TEXT_WORDS, text_weights, k=40)),
+                cooking_time=rnd.randint(5, 180),
+                pub_date=today - timedelta(days=rnd.randrange(DAYS_SPREAD)),
+            )
+            for recipe_id in recipe_ids
+        ])
+
+    ingredient_rows = []
+    tag_rows = []
+    for recipe_id in recipe_ids:
+        for ingredient_id in rnd.sample(
+            ingredient_ids,
+            rnd.randint(MIN_INGREDIENTS, MAX_INGREDIENTS),
+        ):
+            ingredient_rows.append(RecipeIngredient(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_id,
+                amount=rnd.randint(1, 500),
+            ))
+        for tag_id in rnd.sample(tag_ids, rnd.randint(1, len(tag_ids))):
+            tag_rows.append(
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            )
+    _bulk_create(RecipeIngredient, ingredient_rows)
+    _bulk_create(Recipe.tags.through, tag_rows)
+    # bulk_create не вызывает сериализатор, индекс поиска строим сами.
+    for start in range(0, recipes, BATCH_SIZE):
+        update_search_index(recipe_ids[start:start + BATCH_SIZE])
+    transaction.on_commit(lambda: caching.bump_version(
+        caching.RECIPE_INGREDIENTS_VERSION_KEY
+    ))
+
+    popularity = _zipf_weights(recipes)
+    favorite_rows = []
+    cart_rows = []
+    subscription_rows = []
+    for user_id in user_ids:
+        for recipe_id in _sample_distinct(
+            recipe_ids, popularity, rnd.randint(0, 2 * favorites), rnd
+        ):
+            favorite_rows.append(
+                Favorite(user_id=user_id, recipe_id=recipe_id)
+            )
+        for recipe_id in _sample_distinct(
+            recipe_ids, popularity, rnd.randint(0, 2 * carts), rnd
+        ):
+            cart_rows.append(
+                ShoppingCart(user_id=user_id, recipe_id=recipe_id)
+            )
+        for author_id in _sample_distinct(
+            user_ids, author_weights, rnd.randint(0, 2 * subscriptions), rnd
+        ):
+            if author_id != user_id:
+                subscription_rows.append(CustomUser.subscribes.through(
+                    from_customuser_id=user_id,
+                    to_customuser_id=author_id,
+                ))
+    _bulk_create(Favorite, favorite_rows)
+    _bulk_create(ShoppingCart, cart_rows)
+    _bulk_create(CustomUser.subscribes.through, subscription_rows)
+    Recipe.objects.filter(
+        pk__gte=recipe_start, pk__lt=recipe_start + recipes
+    ).repair_counters()
+    _reset_sequences(CustomUser, Recipe)
+    return {
+        'users': users,
+        'recipes': recipes,
+        'ingredients': len(ingredient_rows),
+        'tags': len(tag_rows),
+        'favorites': len(favorite_rows),
+        'carts': len(cart_rows),
+        'subscriptions': len(subscription_rows),
+    }
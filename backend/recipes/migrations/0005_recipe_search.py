@@ -0,0 +1,78 @@
+from django.db import migrations
+
+# Колонка и индекс создаются SQL напрямую: SearchVectorField тянет
+# psycopg2 при импорте, а SQLite для разработки его не требует.
+# SQL заполнения - копия recipes.search на момент миграции: код
+# приложения меняется, а миграция должна выполняться как прежде.
+POSTGRES_SQL = (
+    'ALTER TABLE recipes_recipe '
+    'ADD COLUMN IF NOT EXISTS search_vector tsvector',
+    'CREATE INDEX IF NOT EXISTS recipe_search_vector_idx '
+    'ON recipes_recipe USING gin (search_vector)',
+)
+POSTGRES_FILL_SQL = '''
+    UPDATE recipes_recipe SET search_vector =
+        setweight(to_tsvector('russian', name), 'A')
+        || setweight(to_tsvector('russian', text), 'B')
+        || setweight(to_tsvector('russian', coalesce((
+            SELECT string_agg(ingredient.name, ' ')
+            FROM recipes_recipeingredient AS used
+            JOIN recipes_ingredient AS ingredient
+                ON ingredient.id = used.ingredient_id
+            WHERE used.recipe_id = recipes_recipe.id
+        ), '')), 'C')
+'''
+DROP_POSTGRES_SQL = (
+    'DROP INDEX IF EXISTS recipe_search_vector_idx',
+    'ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector',
+)
+SQLITE_SQL = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_fts '
+    "USING fts5(name, text, ingredients, prefix='2 3')",
+)
+SQLITE_FILL_SQL = '''
+    INSERT INTO recipes_recipe_fts (rowid, name, text, ingredients)
+    SELECT recipe.id, recipe.name, recipe.text, coalesce((
+        SELECT group_concat(ingredient.name, ' ')
+        FROM recipes_recipeingredient AS used
+        JOIN recipes_ingredient AS ingredient
+            ON ingredient.id = used.ingredient_id
+        WHERE used.recipe_id = recipe.id
+    ), '')
+    FROM recipes_recipe AS recipe
+'''
+DROP_SQLITE_SQL = (
+    'DROP TABLE IF EXISTS recipes_recipe_fts',
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor not in ('postgresql', 'sqlite'):
+        return
+    if vendor == 'postgresql':
+        sql_list = (*POSTGRES_SQL, POSTGRES_FILL_SQL)
+    else:
+        sql_list = (*SQLITE_SQL, SQLITE_FILL_SQL)
+    for sql in sql_list:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor not in ('postgresql', 'sqlite'):
+        return
+    sql_list = DROP_POSTGRES_SQL if vendor == 'postgresql' else DROP_SQLITE_SQL
+    for sql in sql_list:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
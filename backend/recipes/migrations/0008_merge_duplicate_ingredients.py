@@ -0,0 +1,58 @@
+# Generated by Django 3.2 on 2026-10-18 19:18
+
+from django.db import migrations
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+
+def merge_duplicates(apps, schema_editor):
+    """
+    Повторный запуск старых скриптов загрузки дублировал ингредиенты.
+    Оставляем ингредиент с меньшим id, составы рецептов переносим на него.
+    Если в рецепте уже есть оставленный ингредиент, количество дубля
+    прибавляется к его строке.
+    """
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    groups = Ingredient.objects.order_by().values(
+        'name', 'measurement_unit'
+    ).annotate(keep=Min('id'), total=Count('id')).filter(total__gt=1)
+    for group in groups:
+        keep = group['keep']
+        duplicates = Ingredient.objects.filter(
+            name=group['name'],
+            measurement_unit=group['measurement_unit'],
+        ).exclude(pk=keep)
+        kept_rows = dict(RecipeIngredient.objects.filter(
+            ingredient_id=keep
+        ).values_list('recipe_id', 'pk'))
+        touched = set()
+        for row in RecipeIngredient.objects.filter(
+            ingredient__in=duplicates
+        ).order_by('pk'):
+            touched.add(row.recipe_id)
+            if row.recipe_id in kept_rows:
+                RecipeIngredient.objects.filter(
+                    pk=kept_rows[row.recipe_id]
+                ).update(amount=F('amount') + row.amount)
+                row.delete()
+                continue
+            row.ingredient_id = keep
+            row.save(update_fields=['ingredient'])
+            kept_rows[row.recipe_id] = row.pk
+        duplicates.delete()
+        Recipe.objects.filter(pk__in=touched).update(
+            updated_at=timezone.now()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2 on 2026-10-18 19:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Отдельная миграция: в Postgres ALTER TABLE нельзя выполнить
+    # в одной транзакции с удалением дублей из 0008.
+
+    dependencies = [
+        ('recipes', '0008_merge_duplicate_ingredients'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient_name_unit'),
+        ),
+    ]
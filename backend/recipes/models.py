@@ -3,6 +3,11 @@ import logging
 from django.conf import settings
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import (
+    Count, Exists, F, OuterRef, Prefetch, Subquery, Value, Window
+)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, Greatest, RowNumber
 
 from .validators import slug_validator
 from user.models import CustomUser
@@ -41,6 +46,104 @@ class RecipeIngredient(models.Model):
         ]
 
 
+def recipe_prefetches() -> list:
+    """Теги и ингредиенты рецептов для prefetch_related."""
+    return [
+        Prefetch('tags', queryset=Tag.objects.all()),
+        Prefetch(
+            'ingredients_used',
+            queryset=RecipeIngredient.objects.select_related('ingredient'),
+        ),
+    ]
+
+
+class RecipeQuerySet(models.QuerySet):
+    def with_related(self):
+        """
+        Подгружает автора, теги и ингредиенты фиксированным числом
+        запросов, независимо от размера выборки.
+        """
+        return self.select_related('author').prefetch_related(
+            *recipe_prefetches()
+        )
+
+    def latest_per_author(self, author_ids, limit: int):
+        """
+        Не больше limit последних рецептов каждого автора
+        одним запросом с ROW_NUMBER() OVER (PARTITION BY author_id).
+        """
+        if not author_ids:
+            # Пустой IN не собирается в SQL для подзапроса.
+            return self.none()
+        ranked = Recipe.objects.filter(
+            author_id__in=author_ids,
+        ).annotate(
+            recipe_rank=Window(
+                expression=RowNumber(),
+                partition_by=[F('author_id')],
+                order_by=[F('pub_date').desc(), F('id').desc()],
+            ),
+        ).order_by().values('id', 'recipe_rank')
+        sql, params = ranked.query.sql_with_params()
+        return self.filter(pk__in=RawSQL(
+            f'SELECT id FROM ({sql}) ranked WHERE recipe_rank <= %s',
+            (*params, limit),
+        ))
+
+    def with_user_flags(self, user):
+        """
+        Аннотирует рецепты флагами is_favorited и is_in_shopping_cart
+        одним запросом на всю выборку. Для анонимов флаги не считаются.
+        """
+        if not user.is_authenticated:
+            return self
+        return self.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+        )
+
+    def add_to_counter(self, model, delta: int) -> int:
+        """
+        Атомарно меняет счётчик избранного или корзин на delta.
+        Ниже нуля счётчик не опускается: иначе разошедшийся счётчик
+        не дал бы удалить рецепт или пользователя каскадом (см.
+        signals.link_deleted). Расхождения чинит repair_counters.
+        """
+        field = COUNTER_FIELDS[model]
+        return self.update(**{field: Greatest(F(field) + delta, 0)})
+
+    def repair_counters(self, dry_run: bool = False) -> dict:
+        """
+        Пересчитывает favorites_count и carts_count по таблицам
+        избранного и корзин. Возвращает число исправленных рецептов.
+        """
+        repaired = {}
+        for model, field in COUNTER_FIELDS.items():
+            actual = Coalesce(
+                Subquery(
+                    model.objects.filter(
+                        recipe=OuterRef('pk')
+                    ).order_by().values('recipe').annotate(
+                        total=Count('pk')
+                    ).values('total')
+                ),
+                Value(0),
+            )
+            stale = self.annotate(actual=actual).exclude(
+                **{field: F('actual')}
+            )
+            repaired[field] = stale.count()
+            if repaired[field] and not dry_run:
+                Recipe.objects.filter(pk__in=stale.values('pk')).update(
+                    **{field: actual}
+                )
+        return repaired
+
+
 class Recipe(models.Model):
     """Модель рецептов приложения."""
     author = models.ForeignKey(
@@ -71,11 +174,46 @@ class Recipe(models.Model):
     pub_date = models.DateField(
         'Дата публикации',
         auto_now_add=True)
+    # Меняется и при правке ингредиентов, тегов и профиля автора,
+    # см. signals.py. По нему считаются ETag и Last-Modified.
+    updated_at = models.DateTimeField(
+        'Изменён',
+        auto_now=True,
+    )
+    # Денормализованные счётчики, меняются вместе с Favorite и
+    # ShoppingCart (см. signals.links_changed), сверяются командой
+    # repair_counters.
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        editable=False,
+    )
+    carts_count = models.PositiveIntegerField(
+        'В списках покупок',
+        default=0,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date', )
+        indexes = [
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx',
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=('-favorites_count', '-id'),
+                name='recipe_favorites_count_idx',
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.name
@@ -128,6 +266,12 @@ class Ingredient(models.Model):
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ('id',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient_name_unit',
+            )
+        ]
 
     def __str__(self) -> str:
         return self.name
@@ -154,6 +298,14 @@ class Favorite(models.Model):
                 name='unique_favorite'
             )
         ]
+        # Уникальный индекс (user, recipe) покрывает выборки по
+        # пользователю, этот - обратные выборки по рецепту.
+        indexes = [
+            models.Index(
+                fields=('recipe', 'user'),
+                name='favorite_recipe_user_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user.username} - {self.recipe.name}'
@@ -180,6 +332,65 @@ class ShoppingCart(models.Model):
                 name='unique_shopping_cart'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=('recipe', 'user'),
+                name='cart_recipe_user_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user.username} - {self.recipe.name}'
+
+
+# Какой счётчик рецепта соответствует таблице связей с пользователями.
+COUNTER_FIELDS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'carts_count',
+}
+
+
+class ShoppingCartExport(models.Model):
+    """Фоновая выгрузка списка покупок в файл."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_exports',
+    )
+    export_format = models.CharField(
+        'Формат',
+        max_length=10,
+    )
+    status = models.CharField(
+        'Статус',
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+    )
+    file = models.FileField(
+        upload_to='exports/',
+        blank=True, null=True,
+    )
+    created = models.DateTimeField(
+        'Создана',
+        auto_now_add=True,
+    )
+
+    class Meta:
+        verbose_name = 'Выгрузка списка покупок'
+        verbose_name_plural = 'Выгрузки списка покупок'
+        ordering = ('-created', )
+
+    def __str__(self):
+        return f'{self.user.username} - {self.export_format} - {self.status}'
@@ -0,0 +1,32 @@
+import json
+from collections import namedtuple
+
+from django.conf import settings
+from rest_framework.parsers import BaseParser
+
+# data - объект из строки, error - текст ошибки, если строка не JSON.
+NDJSONLine = namedtuple('NDJSONLine', ('number', 'data', 'error'))
+
+
+def iter_ndjson(lines, encoding: str):
+    """Строки NDJSON по одной, пустые строки пропускаются."""
+    for number, line in enumerate(lines, start=1):
+        try:
+            line = line.decode(encoding).strip()
+            if line:
+                yield NDJSONLine(number, json.loads(line), None)
+        except ValueError as error:
+            yield NDJSONLine(number, None, f'Некорректный JSON: {error}')
+
+
+class NDJSONParser(BaseParser):
+    """
+    NDJSON: по объекту JSON в строке. Тело читается построчно
+    по мере обработки, request.data - генератор NDJSONLine.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        return iter_ndjson(stream, encoding)
@@ -0,0 +1,39 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """
+    Рендерер для выбора формата списка покупок
+    по ?format= или заголовку Accept.
+    Сам файл отдаётся готовым ответом, сюда попадают только ошибки.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+class PDFRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+
+class CSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class TXTRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class NDJSONRenderer(ShoppingListRenderer):
+    """Выгрузка рецептов, сюда тоже попадают только ошибки."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
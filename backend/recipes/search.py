@@ -0,0 +1,168 @@
+"""
+Полнотекстовый поиск рецептов.
+Postgres: колонка recipes_recipe.search_vector (tsvector) с GIN-индексом,
+вес A - название, B - описание, C - ингредиенты.
+SQLite: виртуальная таблица FTS5 recipes_recipe_fts с теми же весами в bm25.
+Колонка и таблица создаются миграцией 0005 и в модели не описаны,
+чтобы не попадать в каждый SELECT рецептов.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import IntegerField, Q
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+# Веса столбцов name, text, ingredients для bm25.
+FTS_WEIGHTS = (10.0, 5.0, 1.0)
+WORD_PATTERN = re.compile(r'\w+')
+
+POSTGRES_UPDATE_SQL = f'''
+    UPDATE recipes_recipe SET search_vector =
+        setweight(to_tsvector('{SEARCH_CONFIG}', name), 'A')
+        || setweight(to_tsvector('{SEARCH_CONFIG}', text), 'B')
+        || setweight(to_tsvector('{SEARCH_CONFIG}', coalesce((
+            SELECT string_agg(ingredient.name, ' ')
+            FROM recipes_recipeingredient AS used
+            JOIN recipes_ingredient AS ingredient
+                ON ingredient.id = used.ingredient_id
+            WHERE used.recipe_id = recipes_recipe.id
+        ), '')), 'C')
+'''
+POSTGRES_SEARCH_SQL = f'''
+    SELECT id FROM recipes_recipe
+    WHERE search_vector @@ websearch_to_tsquery('{SEARCH_CONFIG}', %s)
+    ORDER BY ts_rank(
+        search_vector, websearch_to_tsquery('{SEARCH_CONFIG}', %s)
+    ) DESC
+    LIMIT %s
+'''
+SQLITE_UPDATE_SQL = f'''
+    INSERT INTO {FTS_TABLE} (rowid, name, text, ingredients)
+    SELECT recipe.id, recipe.name, recipe.text, coalesce((
+        SELECT group_concat(ingredient.name, ' ')
+        FROM recipes_recipeingredient AS used
+        JOIN recipes_ingredient AS ingredient
+            ON ingredient.id = used.ingredient_id
+        WHERE used.recipe_id = recipe.id
+    ), '')
+    FROM recipes_recipe AS recipe
+'''
+SQLITE_SEARCH_SQL = f'''
+    SELECT rowid FROM {FTS_TABLE}
+    WHERE {FTS_TABLE} MATCH %s
+    ORDER BY bm25({FTS_TABLE}, {', '.join(map(str, FTS_WEIGHTS))})
+    LIMIT %s
+'''
+
+
+def _in_clause(recipe_ids) -> tuple:
+    recipe_ids = list(recipe_ids)
+    return ', '.join(['%s'] * len(recipe_ids)), recipe_ids
+
+
+def update_search_index(recipe_ids=None) -> None:
+    """
+    Пересчитывает поисковый индекс переданных рецептов,
+    без recipe_ids - всех рецептов.
+    """
+    if recipe_ids is not None and not recipe_ids:
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            if recipe_ids is None:
+                cursor.execute(POSTGRES_UPDATE_SQL)
+                return
+            placeholders, params = _in_clause(recipe_ids)
+            cursor.execute(
+                f'{POSTGRES_UPDATE_SQL} WHERE id IN ({placeholders})',
+                params,
+            )
+        elif connection.vendor == 'sqlite':
+            if recipe_ids is None:
+                cursor.execute(f'DELETE FROM {FTS_TABLE}')
+                cursor.execute(SQLITE_UPDATE_SQL)
+                return
+            placeholders, params = _in_clause(recipe_ids)
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+                params,
+            )
+            cursor.execute(
+                f'{SQLITE_UPDATE_SQL} WHERE recipe.id IN ({placeholders})',
+                params,
+            )
+
+
+def remove_from_search_index(recipe_ids) -> None:
+    """В Postgres индекс удаляется вместе со строкой рецепта."""
+    if connection.vendor != 'sqlite' or not recipe_ids:
+        return
+    placeholders, params = _in_clause(recipe_ids)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+            params,
+        )
+
+
+def _fts_query(query: str) -> str:
+    """
+    Слова запроса в кавычках, без синтаксиса FTS5 от пользователя.
+    Последнее слово ищется по префиксу - его могут ещё дописывать.
+    """
+    words = [f'"{word}"' for word in WORD_PATTERN.findall(query.lower())]
+    if words:
+        words[-1] += '*'
+    return ' '.join(words)
+
+
+def search_recipe_ids(query: str, limit: int = None) -> list:
+    """Id лучших по релевантности рецептов, по убыванию релевантности."""
+    limit = limit or settings.RECIPE_SEARCH_LIMIT
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(POSTGRES_SEARCH_SQL, (query, query, limit))
+        else:
+            fts_query = _fts_query(query)
+            if not fts_query:
+                return []
+            cursor.execute(SQLITE_SEARCH_SQL, (fts_query, limit))
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_recipes(queryset, query: str):
+    """
+    Оставляет в queryset найденные рецепты и сортирует по релевантности.
+    Для прочих СУБД - поиск по вхождению в название и описание.
+    """
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        return queryset.filter(
+            Q(name__icontains=query) | Q(text__icontains=query)
+        )
+    return order_by_ids(queryset, search_recipe_ids(query))
+
+
+def order_by_ids(queryset, recipe_ids: list):
+    """
+    Оставляет рецепты из recipe_ids в том же порядке.
+    Позиция считается одним выражением: CASE на тысячу веток Django
+    компилирует дольше, чем идёт сам запрос.
+    """
+    if not recipe_ids:
+        return queryset.none()
+    if connection.vendor == 'postgresql':
+        position = RawSQL(
+            'array_position(%s::bigint[], recipes_recipe.id)',
+            (list(recipe_ids), ),
+            output_field=IntegerField(),
+        )
+    else:
+        position = RawSQL(
+            "instr(%s, ',' || recipes_recipe.id || ',')",
+            (f',{",".join(map(str, recipe_ids))},', ),
+            output_field=IntegerField(),
+        )
+    return queryset.filter(pk__in=recipe_ids).order_by(position)
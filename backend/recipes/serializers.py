@@ -1,32 +1,37 @@
-import base64
 import logging
+from functools import cached_property
 
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.db import IntegrityError, transaction
+from django.db.models import prefetch_related_objects
+from django.db.models.fields.files import FieldFile
 from django.conf import settings
-from django.core.files.base import ContentFile
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
 from api.exceptions import BadRequest
-from user.serializers import UserReadSerializer
+from user.serializers import UserReadSerializer, get_subscribed_ids
+from .caching import (
+    bump_cart_versions, bump_recipe_ingredients_version,
+    get_recipe_fragment_key
+)
+from .catalog import tag_catalog
+from .fields import (
+    Base64ImageField, BulkPrimaryKeyRelatedField, ThumbnailImageField
+)
+from .images import generate_variants
 from .models import (
     Favorite, Ingredient, Recipe, RecipeIngredient,
-    ShoppingCart, Tag
+    ShoppingCart, ShoppingCartExport, Tag, recipe_prefetches
 )
+from .search import update_search_index
+from .signals import bulk_changes
+from .tasks import submit
 
 logger = logging.getLogger(__name__)
 
 
-class Base64ImageField(serializers.ImageField):
-    def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-        return super().to_internal_value(data)
-
-
 class TagSerializer(serializers.ModelSerializer):
     """[GET] Сериализатор для запроса (список тегов)."""
     class Meta:
@@ -39,10 +44,43 @@ class TagSerializer(serializers.ModelSerializer):
         )
 
 
+class RecipeIngredientListSerializer(serializers.ListSerializer):
+    """
+    Ингредиенты всех строк состава получаются одним запросом id__in.
+    Ошибки по строкам, как у обычного вложенного списка.
+    """
+    required_fields = ('id', 'amount')
+
+    def _row_errors(self, row, ingredients) -> dict:
+        # При partial=True (PATCH) DRF не проверяет обязательные поля
+        # вложенных строк - проверяем сами.
+        errors = {
+            name: [self.child.fields[name].error_messages['required']]
+            for name in self.required_fields if name not in row
+        }
+        if 'id' in row and row['id'] not in ingredients:
+            message = BulkPrimaryKeyRelatedField.default_error_messages[
+                'does_not_exist'
+            ]
+            errors['id'] = [message.format(pk_value=row['id'])]
+        return errors
+
+    def to_internal_value(self, data):
+        rows = super().to_internal_value(data)
+        ingredients = Ingredient.objects.in_bulk(
+            {row['id'] for row in rows if 'id' in row}
+        )
+        errors = [self._row_errors(row, ingredients) for row in rows]
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        for row in rows:
+            row['id'] = ingredients[row['id']]
+        return rows
+
+
 class RecipeIngredientWriteSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all()
-    )
+    # Объект ингредиента подставляет RecipeIngredientListSerializer.
+    id = serializers.IntegerField()
 
     class Meta:
         model = RecipeIngredient
@@ -50,6 +88,7 @@ class RecipeIngredientWriteSerializer(serializers.ModelSerializer):
             'id',
             'amount',
         )
+        list_serializer_class = RecipeIngredientListSerializer
 
     def validate_amount(self, value):
         if value < 1:
@@ -62,7 +101,7 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
     """
     Сериализатор для POST/PATCH запросов на создание рецептов.
     """
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         many=True,
         queryset=Tag.objects.all(),
         required=True,
@@ -90,20 +129,6 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         unique_items: set = set(initial_items)
         return len(initial_items) != len(unique_items)
 
-    def _is_field_exists_and_clear(
-        self,
-        field: str,
-        validated_data,
-        instance
-    ) -> list:
-        if field in validated_data:
-            items = validated_data.pop(field)
-            if field == 'tags':
-                instance.tags.clear()
-            elif field == 'ingredients':
-                instance.ingredients.clear()
-            return items
-
     def _add_ingredients(self, recipe, ingredients) -> None:
         try:
             RecipeIngredient.objects.bulk_create(
@@ -119,6 +144,73 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         except IntegrityError:
             raise ValidationError('Данный ингредиент уже есть в рецепте!')
 
+    def _add_tags(self, recipe, tags) -> None:
+        Recipe.tags.through.objects.bulk_create([
+            Recipe.tags.through(recipe=recipe, tag=tag) for tag in tags
+        ])
+
+    def _sync_tags(self, recipe, tags) -> bool:
+        """Удаляет и добавляет только изменившиеся теги рецепта."""
+        links = Recipe.tags.through.objects.filter(recipe=recipe)
+        current = set(links.values_list('tag_id', flat=True))
+        wanted = {tag.pk: tag for tag in tags}
+        removed = current - wanted.keys()
+        if removed:
+            links.filter(tag_id__in=removed).delete()
+        self._add_tags(recipe, [
+            tag for pk, tag in wanted.items() if pk not in current
+        ])
+        return bool(removed) or wanted.keys() != current
+
+    def _sync_ingredients(self, recipe, ingredients) -> tuple:
+        """
+        Удаляет, обновляет и добавляет только изменившиеся строки
+        состава. Возвращает (изменился ли набор ингредиентов,
+        изменилось ли хоть что-то).
+        """
+        rows = {
+            row.ingredient_id: row
+            for row in RecipeIngredient.objects.filter(recipe=recipe)
+        }
+        wanted = {item['id'].pk: item for item in ingredients}
+        removed = rows.keys() - wanted.keys()
+        if removed:
+            # Кеш и индексы рецепта update сбрасывает сам, один раз.
+            with bulk_changes():
+                RecipeIngredient.objects.filter(
+                    recipe=recipe, ingredient_id__in=removed
+                ).delete()
+        changed = []
+        for ingredient_id, row in rows.items():
+            amount = wanted.get(ingredient_id, {}).get('amount')
+            if amount is not None and row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount', ))
+        added = [
+            item for ingredient_id, item in wanted.items()
+            if ingredient_id not in rows
+        ]
+        if added:
+            self._add_ingredients(recipe, added)
+        composition_changed = bool(removed or added)
+        return composition_changed, composition_changed or bool(changed)
+
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        finally:
+            # Временный файл картинки удаляем сразу, не дожидаясь сборщика.
+            image = self.validated_data.get('image')
+            if hasattr(image, 'close'):
+                image.close()
+
+    def _schedule_variants(self, recipe) -> None:
+        if recipe.image:
+            name = recipe.image.name
+            transaction.on_commit(lambda: submit(generate_variants, name))
+
     @transaction.atomic
     def create(self, validated_data):
         """Создание рецепта."""
@@ -127,25 +219,59 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         author = self.context.get('request').user
 
         recipe = Recipe.objects.create(author=author, **validated_data)
-        recipe.save()
         self._add_ingredients(recipe, ingredients)
-        recipe.tags.set(tags)
+        self._add_tags(recipe, tags)
+        update_search_index([recipe.pk])
+        bump_recipe_ingredients_version([recipe.pk])
+        self._schedule_variants(recipe)
         return recipe
 
+    @staticmethod
+    def _changed_fields(instance, validated_data) -> list:
+        changed = []
+        for field, value in validated_data.items():
+            current = getattr(instance, field)
+            if isinstance(current, FieldFile):
+                # Пустая картинка хранится как '', а в запросе - None.
+                current = current or None
+            if current != value:
+                changed.append(field)
+        return changed
+
     @transaction.atomic
     def update(self, instance, validated_data):
-        tags = self._is_field_exists_and_clear(
-            'tags',
-            validated_data,
-            instance)
-        ingredients = self._is_field_exists_and_clear(
-            'ingredients',
-            validated_data,
-            instance)
-        super().update(instance, validated_data)
-        instance.tags.set(tags)
-        self._add_ingredients(instance, ingredients)
-        instance.save()
+        """
+        Пишет в базу только то, что изменилось: поля рецепта,
+        связи с тегами и строки состава.
+        """
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
+        changed_fields = self._changed_fields(instance, validated_data)
+        for field in changed_fields:
+            setattr(instance, field, validated_data[field])
+        tags_changed = (
+            tags is not None and self._sync_tags(instance, tags)
+        )
+        composition_changed, ingredients_changed = (
+            self._sync_ingredients(instance, ingredients)
+            if ingredients is not None else (False, False)
+        )
+        if changed_fields or tags_changed or ingredients_changed:
+            # updated_at сдвигаем всегда: по нему ETag и кеш фрагментов.
+            instance.save(update_fields=(*changed_fields, 'updated_at'))
+        if composition_changed and not {'name', 'text'} & set(
+            changed_fields
+        ):
+            # Иначе рецепт уже переиндексировал signals.reindex_recipe.
+            update_search_index([instance.pk])
+        if composition_changed:
+            bump_recipe_ingredients_version([instance.pk])
+        if ingredients_changed:
+            bump_cart_versions(
+                instance.shoppings.values_list('user_id', flat=True)
+            )
+        if 'image' in changed_fields:
+            self._schedule_variants(instance)
         return instance
 
     def validate(self, data):
@@ -153,24 +279,30 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         #     logger.debug('not contains')
         #     raise BadRequest(
         #     'В запросе должны содержаться поля tags, image, ingredients.')
-        if len(data['tags']) < 1:
+        # При PATCH (partial=True) проверяются только переданные поля.
+        tags = data.get('tags')
+        ingredients = data.get('ingredients')
+        if tags is not None and len(tags) < 1:
             raise BadRequest('Количество тегов должно быть как минимум 1.')
-        if len(data['name']) > settings.RECIPE_NAME_MAXLENGTH:
+        if (
+            'name' in data
+            and len(data['name']) > settings.RECIPE_NAME_MAXLENGTH
+        ):
             raise serializers.ValidationError(
                 'Длина названия должна быть не более 200 символов.'
             )
-        if len(data['ingredients']) < 1:
+        if ingredients is not None and len(ingredients) < 1:
             raise serializers.ValidationError(
                 'В рецепте должен быть хотя бы один ингредиент.'
             )
-        if data['cooking_time'] < 1:
+        if 'cooking_time' in data and data['cooking_time'] < 1:
             raise serializers.ValidationError(
                 'Время приготовления должно быть больше или равно 1 минуте.'
             )
         if (
-            self._is_duplicated_items(data['tags'])
-            or self._is_duplicated_items(
-                [item.get('id') for item in data['ingredients']]
+            tags is not None and self._is_duplicated_items(tags)
+            or ingredients is not None and self._is_duplicated_items(
+                [item.get('id') for item in ingredients]
             )
         ):
             logger.debug('Ууупппс, есть повторяющиеся элементы.')
@@ -179,6 +311,11 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         return data
 
     def to_representation(self, instance):
+        # Перечитываем рецепт с подгруженными связями, чтобы ответ
+        # не собирался запросом на каждый ингредиент.
+        instance = Recipe.objects.with_related().with_user_flags(
+            self.context.get('request').user
+        ).get(pk=instance.pk)
         return RecipeReadSerializer(
             instance,
             context=self.context
@@ -204,12 +341,24 @@ class RecipeIngredientReadSerializer(serializers.ModelSerializer):
         )
 
 
+class RecipeFragmentListSerializer(serializers.ListSerializer):
+    """Страница рецептов собирается из кеша одним get_many."""
+    def to_representation(self, data):
+        if hasattr(data, 'all'):
+            data = data.all()
+        return self.child.to_cached_representations(list(data))
+
+
 class RecipeReadSerializer(serializers.ModelSerializer):
-    """Сериализатор для GET запроса получения списка рецептов."""
-    tags = TagSerializer(
-        many=True,
-        read_only=True,
-    )
+    """
+    Сериализатор для GET запроса получения списка рецептов.
+    Теги берутся уже сериализованными из catalog.tag_catalog.
+    Общая для всех пользователей часть рецепта кешируется
+    (см. caching.get_recipe_fragment_key), флаги пользователя
+    подставляются в неё при каждом ответе. Для промахов кеша автор,
+    теги и ингредиенты подгружаются здесь же.
+    """
+    tags = serializers.SerializerMethodField()
     author = UserReadSerializer(
         read_only=True,
     )
@@ -235,21 +384,94 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             'is_favorited',
             'is_in_shopping_cart',
         )
+        list_serializer_class = RecipeFragmentListSerializer
+
+    # False - каждый раз собирать рецепт заново, например в бенчмарках.
+    cache_fragments = True
+
+    def _fragment_key(self, recipe) -> str:
+        request = self.context.get('request')
+        return get_recipe_fragment_key(
+            type(self).__name__,
+            recipe,
+            request.build_absolute_uri('/') if request else '',
+        )
 
-    def is_obj_exists(self, model, obj):
-        return (
-            self.context.get('request').user.is_authenticated
-            and model.objects.filter(
-                user=self.context['request'].user,
-                recipe=obj
-            ).exists()
+    def _with_user_fields(self, fragment: dict, recipe) -> dict:
+        data = dict(fragment)
+        data['author'] = dict(
+            fragment['author'],
+            is_subscribed=recipe.author_id in get_subscribed_ids(
+                self.context.get('request')
+            ),
         )
+        data['is_favorited'] = self.get_is_favorited(recipe)
+        data['is_in_shopping_cart'] = self.get_is_in_shopping_cart(recipe)
+        return data
+
+    def to_cached_representations(self, recipes: list) -> list:
+        keys = [self._fragment_key(recipe) for recipe in recipes]
+        fragments = cache.get_many(keys) if self.cache_fragments else {}
+        missing = [
+            (key, recipe)
+            for key, recipe in zip(keys, recipes)
+            if key not in fragments
+        ]
+        if missing:
+            missing_recipes = [recipe for _, recipe in missing]
+            prefetch_related_objects(
+                missing_recipes, 'author', *recipe_prefetches()
+            )
+            fresh = {
+                key: super(RecipeReadSerializer, self).to_representation(
+                    recipe
+                )
+                for key, recipe in missing
+            }
+            if self.cache_fragments:
+                cache.set_many(
+                    fresh, settings.RECIPE_FRAGMENT_CACHE_TIMEOUT
+                )
+            fragments.update(fresh)
+        return [
+            self._with_user_fields(fragments[key], recipe)
+            for key, recipe in zip(keys, recipes)
+        ]
+
+    def to_representation(self, instance):
+        return self.to_cached_representations([instance])[0]
+
+    @cached_property
+    def _tag_catalog(self) -> dict:
+        # Версию справочника проверяем один раз на ответ, а не на рецепт.
+        return tag_catalog.snapshot()
+
+    def get_tags(self, obj) -> list:
+        return [
+            self._tag_catalog.get(tag.id) or TagSerializer(tag).data
+            for tag in obj.tags.all()
+        ]
+
+    def is_obj_exists(self, model, obj, annotation):
+        user = self.context.get('request').user
+        if not user.is_authenticated:
+            return False
+        # Флаг уже посчитан в RecipeQuerySet.with_user_flags.
+        value = getattr(obj, annotation, None)
+        if value is not None:
+            return value
+        return model.objects.filter(user=user, recipe=obj).exists()
 
     def get_is_favorited(self, obj):
-        return self.is_obj_exists(Favorite, obj)
+        return self.is_obj_exists(Favorite, obj, 'is_favorited')
 
     def get_is_in_shopping_cart(self, obj):
-        return self.is_obj_exists(ShoppingCart, obj)
+        return self.is_obj_exists(ShoppingCart, obj, 'is_in_shopping_cart')
+
+
+class RecipeListSerializer(RecipeReadSerializer):
+    """В ленте рецептов отдаём уменьшенную копию картинки."""
+    image = ThumbnailImageField(read_only=True)
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -263,6 +485,8 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 
 class RecipeReadShortSerializer(serializers.ModelSerializer):
+    image = ThumbnailImageField(read_only=True)
+
     class Meta:
         model = Recipe
         fields = (
@@ -273,6 +497,90 @@ class RecipeReadShortSerializer(serializers.ModelSerializer):
         )
 
 
+class RecipeIngredientTransferSerializer(serializers.Serializer):
+    name = serializers.CharField(source='ingredient.name')
+    measurement_unit = serializers.CharField(
+        source='ingredient.measurement_unit'
+    )
+    amount = serializers.IntegerField(min_value=1)
+
+
+class RecipeExportSerializer(serializers.ModelSerializer):
+    """
+    Строка выгрузки GET /recipes/export.ndjson.
+    Автор, теги и ингредиенты - по email, слагу и паре (название,
+    единица измерения), а не по id, чтобы рецепты переносились
+    между базами. Картинка - имя файла в хранилище.
+    """
+    author = serializers.EmailField(source='author.email')
+    tags = serializers.SlugRelatedField(
+        many=True,
+        read_only=True,
+        slug_field='slug',
+    )
+    ingredients = RecipeIngredientTransferSerializer(
+        source='ingredients_used',
+        many=True,
+    )
+    image = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Recipe
+        fields = (
+            'name',
+            'text',
+            'cooking_time',
+            'author',
+            'image',
+            'tags',
+            'ingredients',
+        )
+
+    def get_image(self, obj):
+        return obj.image.name or None
+
+
+class RecipeImportSerializer(serializers.Serializer):
+    """
+    Строка POST /recipes/bulk/ в формате RecipeExportSerializer.
+    Здесь проверяется только сама строка: теги, ингредиенты и авторов
+    всей пачки строк ищет в базе transfer.import_recipes.
+    Без author рецепт записывается на загружающего.
+    """
+    name = serializers.CharField(max_length=settings.RECIPE_NAME_MAXLENGTH)
+    text = serializers.CharField()
+    cooking_time = serializers.IntegerField(min_value=1)
+    author = serializers.EmailField(required=False)
+    image = Base64ImageField(
+        required=False,
+        allow_null=True,
+        allow_stored=True,
+    )
+    tags = serializers.ListField(
+        child=serializers.SlugField(),
+        allow_empty=False,
+    )
+    ingredients = RecipeIngredientTransferSerializer(
+        many=True,
+        allow_empty=False,
+    )
+
+    def validate_tags(self, value):
+        if len(set(value)) != len(value):
+            raise serializers.ValidationError('Теги повторяются.')
+        return value
+
+    def validate_ingredients(self, value):
+        keys = [
+            (item['ingredient']['name'],
+             item['ingredient']['measurement_unit'])
+            for item in value
+        ]
+        if len(set(keys)) != len(keys):
+            raise serializers.ValidationError('Ингредиенты повторяются.')
+        return value
+
+
 class FavoriteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Favorite
@@ -303,3 +611,24 @@ class ShoppingCartSerializer(FavoriteSerializer):
                 message='Такой рецепт уже есть.'
             )
         ]
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Рецепты для пакетного добавления в избранное или корзину."""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.RECIPE_BULK_MAX_IDS,
+    )
+
+
+class ShoppingCartExportSerializer(serializers.ModelSerializer):
+    """Статус фоновой выгрузки списка покупок."""
+    class Meta:
+        model = ShoppingCartExport
+        fields = (
+            'id',
+            'export_format',
+            'status',
+            'created',
+        )
@@ -1,35 +1,234 @@
-from django.http import HttpResponse
+import csv
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.db.models import Sum
+from django.http import StreamingHttpResponse
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
 
+from . import caching
+from .models import RecipeIngredient, ShoppingCartExport
+
 LINE_OFFSET = 20
 X_COORDINATE = 100
+TITLE_Y_COORDINATE = 800
 INITIAL_Y_COORDINATE = 750
+BOTTOM_MARGIN = 50
+FONT_SIZE = 12
+PDF_FONT_NAME = 'ShoppingListFont'
+FALLBACK_FONT_NAME = 'Helvetica'
+ITERATOR_CHUNK_SIZE = 2000
+FILENAME = 'shopping_cart'
+FILE_BLOCK_SIZE = 8192
 
+logger = logging.getLogger(__name__)
 
-def get_report(ingrediend_list: list) -> HttpResponse:
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = (
-        'attachment; filename="shopping_cart.pdf"'
-    )
-    file = canvas.Canvas(response)
-    file.drawString(100, 800, ('Shopping list'))
-    y_coord = INITIAL_Y_COORDINATE
-    for component in ingrediend_list:
-        name = component.get(
-            'ingredient__name',
-            'Не определено')
-        amount = component.get(
-            'amount',
-            'Не определено')
-        m_unit = component.get(
-            'ingredient__measurement_unit',
-            'Не определено')
-        file.drawString(
-            X_COORDINATE,
-            y_coord,
-            f'{name} - {amount} - {m_unit}'
+
+def get_shopping_list(user):
+    """Суммарное количество каждого ингредиента из корзины пользователя."""
+    return RecipeIngredient.objects.filter(
+        recipe__shoppings__user=user
+    ).values(
+        'ingredient__name', 'ingredient__measurement_unit',
+    ).annotate(
+        amount=Sum('amount')
+    ).order_by('ingredient__name')
+
+
+def _iter_rows(ingredient_list):
+    if hasattr(ingredient_list, 'iterator'):
+        ingredient_list = ingredient_list.iterator(
+            chunk_size=ITERATOR_CHUNK_SIZE
+        )
+    for component in ingredient_list:
+        yield (
+            component.get('ingredient__name', 'Не определено'),
+            component.get('amount', 'Не определено'),
+            component.get('ingredient__measurement_unit', 'Не определено'),
+        )
+
+
+class _Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+    def write(self, value):
+        return value
+
+
+class BaseExporter:
+    """
+    Базовый экспортер списка покупок.
+    Наследники отдают файл по частям через iter_content.
+    """
+    format = None
+    content_type = None
+
+    def __init__(self, ingredient_list):
+        self.ingredient_list = ingredient_list
+
+    @property
+    def filename(self) -> str:
+        return f'{FILENAME}.{self.format}'
+
+    def iter_content(self):
+        raise NotImplementedError
+
+    def get_response(self, content=None):
+        response = StreamingHttpResponse(
+            self.iter_content() if content is None else content,
+            content_type=self.content_type,
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{self.filename}"'
         )
-        y_coord -= LINE_OFFSET
-    file.showPage()
-    file.save()
+        return response
+
+
+class CSVExporter(BaseExporter):
+    format = 'csv'
+    content_type = 'text/csv; charset=utf-8'
+
+    def iter_content(self):
+        writer = csv.writer(_Echo())
+        # BOM нужен, чтобы Excel распознал кириллицу.
+        yield '\ufeff'.encode()
+        yield writer.writerow(
+            ('Ингредиент', 'Количество', 'Ед. измерения')
+        ).encode()
+        for row in _iter_rows(self.ingredient_list):
+            yield writer.writerow(row).encode()
+
+
+class TXTExporter(BaseExporter):
+    format = 'txt'
+    content_type = 'text/plain; charset=utf-8'
+
+    def iter_content(self):
+        yield 'Список покупок\n\n'.encode()
+        for name, amount, m_unit in _iter_rows(self.ingredient_list):
+            yield f'{name} - {amount} - {m_unit}\n'.encode()
+
+
+class PDFExporter(BaseExporter):
+    """
+    Canvas reportlab держит все страницы в памяти до save(), поэтому
+    PDF собирается целиком во временный файл ещё до ответа - ошибка
+    сборки не уходит клиенту под видом файла, - а отдаётся блоками.
+    """
+    format = 'pdf'
+    content_type = 'application/pdf'
+
+    def _get_font(self) -> str:
+        if PDF_FONT_NAME in pdfmetrics.getRegisteredFontNames():
+            return PDF_FONT_NAME
+        font_path = settings.SHOPPING_CART_PDF_FONT
+        if not os.path.exists(font_path):
+            logger.warning(
+                'Шрифт %s не найден, кириллица не будет отображаться.',
+                font_path,
+            )
+            return FALLBACK_FONT_NAME
+        pdfmetrics.registerFont(TTFont(PDF_FONT_NAME, font_path))
+        return PDF_FONT_NAME
+
+    def render(self, file) -> None:
+        font = self._get_font()
+        pdf = canvas.Canvas(file, pagesize=A4)
+        pdf.setFont(font, FONT_SIZE)
+        pdf.drawString(X_COORDINATE, TITLE_Y_COORDINATE, 'Список покупок')
+        y_coord = INITIAL_Y_COORDINATE
+        for name, amount, m_unit in _iter_rows(self.ingredient_list):
+            if y_coord < BOTTOM_MARGIN:
+                pdf.showPage()
+                pdf.setFont(font, FONT_SIZE)
+                y_coord = TITLE_Y_COORDINATE
+            pdf.drawString(
+                X_COORDINATE,
+                y_coord,
+                f'{name} - {amount} - {m_unit}'
+            )
+            y_coord -= LINE_OFFSET
+        pdf.showPage()
+        pdf.save()
+
+    def iter_content(self):
+        file = tempfile.TemporaryFile()
+        try:
+            self.render(file)
+        except Exception:
+            file.close()
+            raise
+        file.seek(0)
+        return self._iter_file(file)
+
+    @staticmethod
+    def _iter_file(file):
+        with file:
+            yield from iter(lambda: file.read(FILE_BLOCK_SIZE), b'')
+
+
+EXPORTERS = {
+    exporter.format: exporter
+    for exporter in (PDFExporter, CSVExporter, TXTExporter)
+}
+
+
+def get_cached_report(user, export_format: str = 'pdf'):
+    """
+    Список покупок из кеша.
+    При промахе файл собирается заново и кешируется по ходу отдачи,
+    ключ меняется вместе с версией корзины пользователя.
+    """
+    exporter_class = EXPORTERS.get(export_format, PDFExporter)
+    key = caching.get_cart_file_key(user.id, exporter_class.format)
+    content = cache.get(key)
+    if content is not None:
+        caching.incr_stat('hits')
+        response = exporter_class(None).get_response([content])
+        response['X-Cache'] = 'HIT'
+        return response
+    caching.incr_stat('misses')
+    exporter = exporter_class(get_shopping_list(user))
+    response = exporter.get_response(
+        caching.cache_chunks(exporter.iter_content(), key)
+    )
+    response['X-Cache'] = 'MISS'
     return response
+
+
+def render_shopping_cart_export(export_id: int) -> None:
+    """
+    Фоновая задача: собирает файл списка покупок в MEDIA_ROOT.
+    При любой ошибке выгрузка, если она ещё есть, помечается FAILED.
+    """
+    try:
+        export = ShoppingCartExport.objects.select_related('user').get(
+            pk=export_id
+        )
+        export.status = ShoppingCartExport.RUNNING
+        export.save(update_fields=('status', ))
+        exporter = EXPORTERS[export.export_format](
+            get_shopping_list(export.user)
+        )
+        with tempfile.TemporaryFile() as file:
+            for chunk in exporter.iter_content():
+                file.write(chunk)
+            export.file.save(
+                f'{export.user_id}_{export.pk}_{exporter.filename}',
+                File(file),
+                save=False,
+            )
+    except Exception:
+        logger.exception('Не удалось собрать выгрузку %s.', export_id)
+        ShoppingCartExport.objects.filter(pk=export_id).update(
+            status=ShoppingCartExport.FAILED
+        )
+        return
+    export.status = ShoppingCartExport.DONE
+    export.save(update_fields=('status', 'file'))
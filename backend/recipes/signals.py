@@ -0,0 +1,186 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import caching
+from .models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart, Tag
+)
+from .search import remove_from_search_index, update_search_index
+from user.models import CustomUser
+
+
+_state = threading.local()
+
+
+@contextmanager
+def bulk_changes():
+    """
+    Код, который пишет состав и связи пачкой, сам обновляет счётчики,
+    индексы и версии кеша - разом, а не по строке. Внутри блока
+    сигналы состава, избранного и корзин ничего не делают.
+    """
+    previous = getattr(_state, 'bulk', False)
+    _state.bulk = True
+    try:
+        yield
+    finally:
+        _state.bulk = previous
+
+
+def _in_bulk() -> bool:
+    return getattr(_state, 'bulk', False)
+
+
+def touch_recipes(recipes) -> None:
+    """Отметить рецепты изменёнными: сбрасывает их ETag."""
+    recipes.update(updated_at=timezone.now())
+
+
+def bump_cart_versions_on_commit(user_ids) -> None:
+    user_ids = list(user_ids)
+    transaction.on_commit(lambda: caching.bump_cart_versions(user_ids))
+
+
+def links_changed(model, user_id: int, recipe_ids, delta: int) -> None:
+    """
+    Пользователь добавил (delta=1) или убрал (delta=-1) рецепты
+    в избранном или корзине (model): счётчики рецептов, версия флагов
+    и для корзины - версия файла списка покупок.
+    Сигналы Favorite и ShoppingCart вызывают её сами, а после
+    bulk_create и удаления внутри bulk_changes её вызывают явно.
+    """
+    Recipe.objects.filter(pk__in=recipe_ids).add_to_counter(model, delta)
+    transaction.on_commit(
+        lambda: caching.bump_user_flags_version(user_id)
+    )
+    if model is ShoppingCart:
+        bump_cart_versions_on_commit((user_id, ))
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_ingredients_version(sender, **kwargs):
+    caching.bump_version(caching.INGREDIENTS_VERSION_KEY)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def bump_tags_version(sender, **kwargs):
+    caching.bump_version(caching.TAGS_VERSION_KEY)
+
+
+@receiver(post_delete, sender=Ingredient)
+def bump_recipe_ingredients_version(sender, **kwargs):
+    # Вместе с ингредиентом каскадом удалён и состав рецептов.
+    transaction.on_commit(lambda: caching.bump_version(
+        caching.RECIPE_INGREDIENTS_VERSION_KEY
+    ))
+
+
+@receiver(post_save, sender=Ingredient)
+def reindex_ingredient_recipes(sender, instance, created, **kwargs):
+    """Название ингредиента входит в поисковый индекс рецептов."""
+    if created:
+        return
+    update_search_index(list(
+        RecipeIngredient.objects.filter(
+            ingredient=instance
+        ).values_list('recipe_id', flat=True)
+    ))
+    touch_recipes(Recipe.objects.filter(ingredients=instance))
+
+
+@receiver(pre_delete, sender=Ingredient)
+def touch_ingredient_recipes(sender, instance, **kwargs):
+    touch_recipes(Recipe.objects.filter(ingredients=instance))
+
+
+@receiver((post_save, pre_delete), sender=Tag)
+def touch_tag_recipes(sender, instance, **kwargs):
+    if not kwargs.get('created'):
+        touch_recipes(Recipe.objects.filter(tags=instance))
+
+
+@receiver(post_save, sender=CustomUser)
+def touch_author_recipes(sender, instance, created, update_fields, **kwargs):
+    """Автор выводится в рецепте, вход в систему его не меняет."""
+    if created or update_fields == frozenset(('last_login', )):
+        return
+    touch_recipes(Recipe.objects.filter(author=instance))
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_from_search(sender, instance, **kwargs):
+    remove_from_search_index([instance.pk])
+    caching.bump_recipe_ingredients_version([instance.pk])
+
+
+@receiver(post_save, sender=Recipe)
+def reindex_recipe(sender, instance, created, update_fields, **kwargs):
+    """
+    Новый рецепт индексируют после записи состава, у прежнего
+    в индекс входят название и описание.
+    """
+    if created or (
+        update_fields is not None
+        and not {'name', 'text'} & update_fields
+    ):
+        return
+    update_search_index([instance.pk])
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def recipe_ingredients_changed(sender, instance, **kwargs):
+    """
+    Строка состава записана по одной (админка): API пишет состав
+    пачками и сбрасывает всё это сам.
+    """
+    if _in_bulk():
+        return
+    recipe_ids = [instance.recipe_id]
+    touch_recipes(Recipe.objects.filter(pk__in=recipe_ids))
+    update_search_index(recipe_ids)
+    caching.bump_recipe_ingredients_version(recipe_ids)
+    bump_cart_versions_on_commit(
+        ShoppingCart.objects.filter(
+            recipe_id=instance.recipe_id
+        ).values_list('user_id', flat=True)
+    )
+
+
+@receiver(pre_save, sender=Favorite)
+@receiver(pre_save, sender=ShoppingCart)
+def remember_link(sender, instance, **kwargs):
+    """Прежние пользователь и рецепт связи, которую правят в админке."""
+    instance._saved_link = None
+    if instance.pk is not None:
+        instance._saved_link = sender.objects.filter(
+            pk=instance.pk
+        ).values_list('user_id', 'recipe_id').first()
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def link_saved(sender, instance, created, **kwargs):
+    if _in_bulk():
+        return
+    saved = getattr(instance, '_saved_link', None)
+    if saved == (instance.user_id, instance.recipe_id):
+        return
+    if saved is not None and not created:
+        links_changed(sender, saved[0], (saved[1], ), -1)
+    links_changed(sender, instance.user_id, (instance.recipe_id, ), 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def link_deleted(sender, instance, **kwargs):
+    if _in_bulk():
+        return
+    # Каскадом от рецепта или пользователя тоже: по строке на связь.
+    links_changed(sender, instance.user_id, (instance.recipe_id, ), -1)
@@ -0,0 +1,61 @@
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _init_process():
+    """Процесс пула стартует с нуля, поэтому Django нужно поднять заново."""
+    django.setup()
+
+
+def _run(func, *args):
+    close_old_connections()
+    try:
+        return func(*args)
+    except Exception:
+        logger.exception('Фоновая задача %s упала.', func.__name__)
+        raise
+    finally:
+        close_old_connections()
+
+
+def get_executor():
+    """
+    Локальный пул для фоновых задач, создаётся при первом обращении.
+    BACKGROUND_EXECUTOR: process - пул процессов, thread - пул потоков.
+    """
+    global _executor
+    if _executor is None:
+        if settings.BACKGROUND_EXECUTOR == 'process':
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.BACKGROUND_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_process,
+            )
+        else:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BACKGROUND_WORKERS,
+            )
+    return _executor
+
+
+def submit(func, *args) -> None:
+    """
+    Ставит func(*args) в фоновый пул.
+    При BACKGROUND_EXECUTOR = 'sync' задача выполняется сразу,
+    это удобно для тестов и отладки.
+    Аргументы должны сериализоваться pickle, поэтому передаём id, а не
+    объекты моделей.
+    """
+    if settings.BACKGROUND_EXECUTOR == 'sync':
+        func(*args)
+        return
+    get_executor().submit(_run, func, *args)
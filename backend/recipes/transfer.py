@@ -0,0 +1,225 @@
+"""
+Перенос рецептов между базами: потоковая выгрузка в NDJSON
+и загрузка пачками через bulk_create.
+"""
+import json
+from itertools import islice
+
+from django.db import connection, transaction
+from django.db.models import prefetch_related_objects
+
+from user.models import CustomUser
+from .caching import bump_recipe_ingredients_version
+from .images import generate_variants
+from .models import (
+    Ingredient, Recipe, RecipeIngredient, Tag, recipe_prefetches
+)
+from .search import update_search_index
+from .serializers import RecipeExportSerializer, RecipeImportSerializer
+from .tasks import submit
+
+EXPORT_CHUNK_SIZE = 500
+IMPORT_CHUNK_SIZE = 200
+
+
+def _chunks(items, size: int):
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_export(queryset, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """
+    Рецепты строками NDJSON. Таблица читается через iterator(),
+    теги и ингредиенты подгружаются двумя запросами на пачку:
+    prefetch_related с iterator() не работает.
+    """
+    recipes = queryset.select_related('author').order_by('pk').iterator(
+        chunk_size=chunk_size
+    )
+    for chunk in _chunks(recipes, chunk_size):
+        prefetch_related_objects(chunk, *recipe_prefetches())
+        yield b''.join(
+            json.dumps(data, ensure_ascii=False).encode() + b'\n'
+            for data in RecipeExportSerializer(chunk, many=True).data
+        )
+
+
+class _References:
+    """Авторы, теги и ингредиенты пачки строк, по запросу на каждых."""
+    def __init__(self, rows: list):
+        self.authors = CustomUser.objects.in_bulk(
+            {row['author'] for row in rows if 'author' in row},
+            field_name='email',
+        )
+        self.tags = Tag.objects.in_bulk(
+            {slug for row in rows for slug in row['tags']},
+            field_name='slug',
+        )
+        self.ingredients = {
+            (ingredient.name, ingredient.measurement_unit): ingredient
+            for ingredient in Ingredient.objects.filter(name__in={
+                item['ingredient']['name']
+                for row in rows for item in row['ingredients']
+            })
+        }
+
+    def resolve(self, row: dict, user) -> dict:
+        """Подставляет объекты вместо ссылок, возвращает ошибки строки."""
+        errors = {}
+        if 'author' in row:
+            row['author'] = self.authors.get(row['author'])
+            if row['author'] is None:
+                errors['author'] = ['Пользователь не найден.']
+        else:
+            row['author'] = user
+        missing = [slug for slug in row['tags'] if slug not in self.tags]
+        if missing:
+            errors['tags'] = [
+                f'Тег "{slug}" не найден.' for slug in missing
+            ]
+        row['tags'] = [self.tags.get(slug) for slug in row['tags']]
+        missing = []
+        for item in row['ingredients']:
+            key = (
+                item['ingredient']['name'],
+                item['ingredient']['measurement_unit'],
+            )
+            item['ingredient'] = self.ingredients.get(key)
+            if item['ingredient'] is None:
+                missing.append(
+                    f'Ингредиент "{key[0]}, {key[1]}" не найден.'
+                )
+        if missing:
+            errors['ingredients'] = missing
+        return errors
+
+
+def _store_images(rows: list) -> None:
+    """
+    Сохраняет новые картинки пачки и подставляет в строки их имена.
+    Имя файла - хеш содержимого: одинаковая картинка в нескольких
+    строках пишется один раз, а уже сохранённая (в том числе другим
+    запросом после проверки строк) не пишется вовсе. Иначе storage
+    дал бы копии с суффиксом в имени.
+    """
+    field = Recipe._meta.get_field('image')
+    stored = {}
+    for row in rows:
+        image = row.get('image')
+        if not hasattr(image, 'read'):
+            continue
+        name = field.generate_filename(None, image.name)
+        if name not in stored:
+            stored[name] = (
+                name if field.storage.exists(name)
+                else field.storage.save(name, image)
+            )
+        row['image'] = stored[name]
+        image.close()
+
+
+def _insert_recipes(recipes: list) -> None:
+    if connection.features.can_return_rows_from_bulk_insert:
+        Recipe.objects.bulk_create(recipes)
+        return
+    # SQLite в Django 3.2 не возвращает id из bulk_create.
+    for recipe in recipes:
+        recipe.save(force_insert=True)
+
+
+@transaction.atomic
+def _create_recipes(rows: list) -> list:
+    _store_images(rows)
+    recipes = [
+        Recipe(
+            author=row['author'],
+            name=row['name'],
+            text=row['text'],
+            cooking_time=row['cooking_time'],
+            image=row.get('image'),
+        )
+        for row in rows
+    ]
+    _insert_recipes(recipes)
+    RecipeIngredient.objects.bulk_create([
+        RecipeIngredient(
+            recipe=recipe,
+            ingredient=item['ingredient'],
+            amount=item['amount'],
+        )
+        for recipe, row in zip(recipes, rows)
+        for item in row['ingredients']
+    ])
+    Recipe.tags.through.objects.bulk_create([
+        Recipe.tags.through(recipe=recipe, tag=tag)
+        for recipe, row in zip(recipes, rows)
+        for tag in row['tags']
+    ])
+    recipe_ids = [recipe.pk for recipe in recipes]
+    update_search_index(recipe_ids)
+    bump_recipe_ingredients_version(recipe_ids)
+    for name in {recipe.image.name for recipe in recipes if recipe.image}:
+        transaction.on_commit(
+            lambda name=name: submit(generate_variants, name)
+        )
+    return recipe_ids
+
+
+def _import_chunk(lines: list, user, result: dict) -> None:
+    valid = []
+    for line in lines:
+        if line.error is not None:
+            result['errors'].append({
+                'line': line.number,
+                'errors': {'non_field_errors': [line.error]},
+            })
+            continue
+        serializer = RecipeImportSerializer(data=line.data)
+        if serializer.is_valid():
+            valid.append((line.number, serializer.validated_data))
+        else:
+            result['errors'].append({
+                'line': line.number,
+                'errors': serializer.errors,
+            })
+    if not valid:
+        return
+    try:
+        references = _References([row for _, row in valid])
+        numbers, rows = [], []
+        for number, row in valid:
+            errors = references.resolve(row, user)
+            if errors:
+                result['errors'].append({'line': number, 'errors': errors})
+            else:
+                numbers.append(number)
+                rows.append(row)
+        if rows:
+            result['created'].extend(
+                {'line': number, 'id': recipe_id}
+                for number, recipe_id in zip(numbers, _create_recipes(rows))
+            )
+    finally:
+        # Файлы картинок строк с ошибками удаляем сразу,
+        # не дожидаясь сборщика.
+        for _, row in valid:
+            if hasattr(row.get('image'), 'close'):
+                row['image'].close()
+
+
+def import_recipes(lines, user, chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    """
+    Загружает рецепты из строк NDJSON (см. parsers.NDJSONLine).
+    Строки проверяются и записываются пачками по chunk_size, каждая
+    пачка - в своей транзакции, в памяти одновременно только она.
+    Возвращает id созданных рецептов и ошибки по номерам строк.
+    """
+    result = {'created': [], 'errors': []}
+    for chunk in _chunks(lines, chunk_size):
+        _import_chunk(chunk, user, result)
+    result['errors'].sort(key=lambda error: error['line'])
+    return result
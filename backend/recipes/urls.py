@@ -1,7 +1,9 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import IngredientsViewSet, RecipeViewSet, TagsViewSet
+from .views import (
+    IngredientsViewSet, RecipeExportView, RecipeViewSet, TagsViewSet
+)
 
 router = DefaultRouter()
 
@@ -22,5 +24,11 @@ router.register(
 )
 
 urlpatterns = [
+    # До роутера: иначе адрес займёт recipes/{pk}.{format}.
+    path(
+        'recipes/export.ndjson',
+        RecipeExportView.as_view(),
+        name='recipes-export',
+    ),
     path('', include(router.urls)),
 ]
@@ -1,32 +1,52 @@
 import logging
 
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Sum
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.http import FileResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters, permissions, status, viewsets
+from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
 from api.exceptions import BadRequest
-from api.paginators import CustomPaginator
-from .filters import RecipeFilter
+from api.mixins import ConditionalGetMixin, CursorPaginationMixin
+from api.paginators import CustomPaginator, RecipeKeysetPaginator
+from .caching import get_user_flags_version, get_version
+from .catalog import ingredient_catalog, tag_catalog
+from .filters import (
+    IngredientSearchFilter, RecipeFilter, RecipeOrderingFilter,
+    RecipeSearchFilter
+)
 from .models import (
-    Favorite, Ingredient, RecipeIngredient, Recipe,
-    ShoppingCart, Tag
+    Favorite, Ingredient, Recipe, ShoppingCart, ShoppingCartExport, Tag
 )
+from .parsers import NDJSONParser
 from .permissions import IsAuthorOrAdmin
+from .renderers import CSVRenderer, NDJSONRenderer, PDFRenderer, TXTRenderer
 from .serializers import (
-    FavoriteSerializer, IngredientSerializer, RecipeReadSerializer,
+    FavoriteSerializer, IngredientSerializer, RecipeIdsSerializer,
+    RecipeListSerializer, RecipeReadSerializer,
     RecipeReadShortSerializer, RecipeCreateUpdateSerializer,
-    ShoppingCartSerializer, TagSerializer
+    ShoppingCartExportSerializer, ShoppingCartSerializer, TagSerializer
+)
+from .services import (
+    EXPORTERS, get_cached_report, render_shopping_cart_export
 )
-from .services import get_report
+from .signals import bulk_changes, links_changed
+from .tasks import submit
+from .transfer import import_recipes, iter_export
+from user.models import CustomUser
 
 logger = logging.getLogger(__name__)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    ConditionalGetMixin, CursorPaginationMixin, viewsets.ModelViewSet
+):
     """
     Работа с рецептами.
     GET /recipes/ - Страница доступна всем пользователям.
@@ -34,10 +54,25 @@ class RecipeViewSet(viewsets.ModelViewSet):
     POST /reipes/ - Доступно только авторизованному пользователю.
     UPDATE /recipes/ - доступной только автору.
     DELETE /recipes/ - доступной только автору.
+    ?pagination=cursor - курсорная пагинация по (pub_date, id)
+    или по полям ?ordering=, порядок ?search= и ?have= сохраняется.
+    ?search= - полнотекстовый поиск, выдача по релевантности.
+    ?have=1,5,9 - рецепты по доле имеющихся ингредиентов.
+    ?ordering=-favorites_count - сначала популярные.
+    GET /recipes/{id}/ отдаёт ETag, анонимам - ещё и Last-Modified.
+    POST/DELETE /recipes/favorite/, /recipes/shopping_cart/ с
+    {"ids": [...]} - сразу несколько рецептов, ответ по каждому id.
+    POST /recipes/bulk/ - загрузка рецептов из NDJSON, только для staff,
+    выгрузка - RecipeExportView.
     """
     pagination_class = CustomPaginator
-    filter_backends = (DjangoFilterBackend, )
+    cursor_pagination_class = RecipeKeysetPaginator
+    filter_backends = (
+        DjangoFilterBackend, RecipeSearchFilter, RecipeOrderingFilter
+    )
     filterset_class = RecipeFilter
+    ordering_fields = ('favorites_count', 'carts_count', 'pub_date')
+    vary_on_user = True
 
     def _get_object_or_400(self, model, *args, **kwargs):
         try:
@@ -53,7 +88,10 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 'recipe': int(kwargs['pk']), },
         )
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        # Счётчик рецепта и версии кеша обновляет signals.link_saved.
+        with transaction.atomic():
+            self._lock_user_links(request.user)
+            serializer.save()
         return Response(
             RecipeReadShortSerializer(recipe).data,
             status=status.HTTP_201_CREATED
@@ -61,21 +99,146 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     def _delete_item(self, model, request, **kwargs) -> Response:
         recipe = get_object_or_404(Recipe, id=kwargs['pk'])
-        self._get_object_or_400(
-            model,
-            user=request.user,
-            recipe=recipe,
-        )
-        model.objects.filter(
-            user=request.user,
-            recipe=recipe,
-        ).delete()
+        with transaction.atomic():
+            # Параллельный запрос на ту же связь дождётся коммита и уже
+            # её не найдёт: signals.link_deleted уменьшит счётчик
+            # один раз.
+            link = model.objects.select_for_update().filter(
+                user=request.user,
+                recipe=recipe,
+            ).first()
+            if link is None:
+                raise BadRequest()
+            link.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def _get_bulk_recipes(self, model, request) -> tuple:
+        """
+        id из запроса без повторов и найденные рецепты с флагом linked -
+        есть ли рецепт у пользователя в model. Один запрос.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        recipes = Recipe.objects.filter(pk__in=ids).annotate(
+            linked=Exists(
+                model.objects.filter(user=request.user, recipe=OuterRef('pk'))
+            )
+        ).in_bulk()
+        return ids, recipes
+
+    @staticmethod
+    def _lock_user_links(user) -> None:
+        """
+        Запросы, добавляющие связи пользователя, идут по очереди
+        до коммита: иначе строку, вставленную параллельным запросом,
+        bulk_create(ignore_conflicts=True) пропустил бы молча, а счётчик
+        всё равно бы вырос.
+        """
+        CustomUser.objects.select_for_update().filter(pk=user.pk).first()
+
+    def _add_items(self, model, request) -> Response:
+        """Добавляет рецепты из {"ids": [...]} одним bulk_create."""
+        ids, recipes = self._get_bulk_recipes(model, request)
+        added = [pk for pk in ids if pk in recipes and not recipes[pk].linked]
+        if added:
+            with transaction.atomic():
+                self._lock_user_links(request.user)
+                # Связи, добавленные до блокировки параллельным запросом.
+                for pk in model.objects.filter(
+                    user=request.user, recipe_id__in=added
+                ).values_list('recipe_id', flat=True):
+                    recipes[pk].linked = True
+                added = [pk for pk in added if not recipes[pk].linked]
+                if added:
+                    model.objects.bulk_create(
+                        [
+                            model(user=request.user, recipe_id=pk)
+                            for pk in added
+                        ],
+                        ignore_conflicts=True,
+                    )
+                    links_changed(model, request.user.id, added, 1)
+        results = []
+        for pk in ids:
+            if pk not in recipes:
+                results.append({'id': pk, 'status': 'not_found'})
+                continue
+            results.append({
+                'id': pk,
+                'status': 'exists' if recipes[pk].linked else 'added',
+                'recipe': RecipeReadShortSerializer(
+                    recipes[pk], context={'request': request}
+                ).data,
+            })
+        return Response({'results': results})
+
+    def _delete_items(self, model, request) -> Response:
+        """Удаляет рецепты из {"ids": [...]} одним DELETE."""
+        ids, recipes = self._get_bulk_recipes(model, request)
+        with transaction.atomic():
+            # Строки связей блокируются до коммита: параллельный запрос
+            # с теми же id их уже не найдёт, и счётчики уменьшатся
+            # только на действительно удалённые строки.
+            deleted = set(
+                model.objects.select_for_update().filter(
+                    user=request.user, recipe_id__in=list(recipes)
+                ).values_list('recipe_id', flat=True)
+            )
+            if deleted:
+                # Счётчики и версии разом обновляет links_changed,
+                # а не сигнал на каждую строку.
+                with bulk_changes():
+                    model.objects.filter(
+                        user=request.user, recipe_id__in=deleted
+                    ).delete()
+                links_changed(model, request.user.id, deleted, -1)
+        results = []
+        for pk in ids:
+            if pk not in recipes:
+                result = 'not_found'
+            elif pk in deleted:
+                result = 'deleted'
+            else:
+                result = 'missing'
+            results.append({'id': pk, 'status': result})
+        return Response({'results': results})
+
     def get_queryset(self):
         queryset = Recipe.objects.all()
+        if self.action in ('list', 'retrieve'):
+            # Теги и ингредиенты нужны только при промахе кеша
+            # фрагментов, их подгружает RecipeReadSerializer.
+            queryset = queryset.select_related('author').with_user_flags(
+                self.request.user
+            )
         return queryset
 
+    def get_conditional_stamp(self, request, *args, **kwargs):
+        """
+        Рецепт без учёта пользователя описывает updated_at,
+        флаги is_favorited, is_in_shopping_cart и is_subscribed -
+        версия флагов пользователя.
+        """
+        if self.action != 'retrieve':
+            return None
+        try:
+            updated_at = Recipe.objects.filter(
+                pk=kwargs['pk']
+            ).values_list('updated_at', flat=True).first()
+        except ValueError:
+            return None
+        if updated_at is None:
+            return None
+        last_modified = int(updated_at.timestamp())
+        if not request.user.is_authenticated:
+            return (updated_at.isoformat(), ), last_modified
+        return (
+            updated_at.isoformat(),
+            request.user.id,
+            get_user_flags_version(request.user.id),
+        ), None
+
     def get_permissions(self):
         if self.action == "list":
             self.permission_classes = (permissions.AllowAny,)
@@ -88,29 +251,129 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def get_serializer_class(self):
         if self.action == 'create' or self.action == 'partial_update':
             return RecipeCreateUpdateSerializer
+        if self.action == 'list':
+            return RecipeListSerializer
         return RecipeReadSerializer
 
+    @staticmethod
+    def _is_async_export(request) -> bool:
+        return (
+            request.method == 'POST'
+            and request.query_params.get('async') == '1'
+        )
+
+    def perform_content_negotiation(self, request, force=False):
+        if (
+            self.action == 'download_shopping_cart'
+            and self._is_async_export(request)
+        ):
+            # Файл собирается в фоне, а в ответе - JSON со статусом задачи.
+            renderer = JSONRenderer()
+            return renderer, renderer.media_type
+        return super().perform_content_negotiation(request, force)
+
+    def handle_exception(self, exc):
+        response = super().handle_exception(exc)
+        if self.action == 'download_shopping_cart':
+            # Ошибка - не файл: отдаём её JSON, а не под видом PDF/CSV/TXT.
+            self.request.accepted_renderer = JSONRenderer()
+            self.request.accepted_media_type = JSONRenderer.media_type
+        return response
+
     @action(
         detail=False,
-        methods=['GET', ],
+        methods=['GET', 'POST', ],
         permission_classes=(permissions.IsAuthenticated, ),
         url_path='download_shopping_cart',
+        renderer_classes=(
+            PDFRenderer, CSVRenderer, TXTRenderer, JSONRenderer
+        ),
     )
     def download_shopping_cart(self, request, **kwargs):
         """
         Скачать список покупок
         Скачать файл со списком покупок. Это может быть TXT/PDF/CSV.
+        Формат выбирается параметром ?format= или заголовком Accept,
+        по умолчанию PDF. Accept: application/json тоже получает PDF,
+        а ошибки всегда отдаются JSON.
+        [POST ?async=1] - файл собирается в фоне, в ответе id задачи,
+        забрать файл можно по download_shopping_cart/{id}/, старые
+        выгрузки удаляет команда clean_exports. POST без async=1 -
+        как GET.
         Доступно только авторизованным пользователям.
         """
+        if not self._is_async_export(request):
+            export_format = request.accepted_renderer.format
+            if export_format not in EXPORTERS:
+                export_format = PDFRenderer.format
+            return get_cached_report(request.user, export_format)
+        export_format = request.query_params.get('format', PDFRenderer.format)
+        if export_format not in EXPORTERS:
+            raise BadRequest(f'Неизвестный формат файла: {export_format}.')
+        export = ShoppingCartExport.objects.create(
+            user=request.user,
+            export_format=export_format,
+        )
+        submit(render_shopping_cart_export, export.pk)
+        export.refresh_from_db()
+        return Response(
+            ShoppingCartExportSerializer(export).data,
+            status=status.HTTP_202_ACCEPTED,
+        )
 
-        ingrediend_list = RecipeIngredient.objects.filter(
-            recipe__shoppings__user=request.user
-        ).values(
-            'ingredient__name', 'ingredient__measurement_unit',
-        ).annotate(
-            amount=Sum('amount')
+    @action(
+        detail=False,
+        methods=['GET', ],
+        permission_classes=(permissions.IsAuthenticated, ),
+        url_path=r'download_shopping_cart/(?P<export_id>\d+)',
+    )
+    def shopping_cart_export(self, request, export_id, **kwargs):
+        """
+        Статус фоновой выгрузки списка покупок.
+        Готовый файл отдаётся сразу, иначе - JSON со статусом.
+        """
+        export = get_object_or_404(
+            ShoppingCartExport,
+            pk=export_id,
+            user=request.user,
+        )
+        if export.status == ShoppingCartExport.DONE:
+            return FileResponse(
+                export.file.open('rb'),
+                as_attachment=True,
+                filename=f'shopping_cart.{export.export_format}',
+            )
+        return Response(
+            ShoppingCartExportSerializer(export).data,
+            status=(
+                status.HTTP_200_OK
+                if export.status == ShoppingCartExport.FAILED
+                else status.HTTP_202_ACCEPTED
+            ),
+        )
+
+    @action(
+        detail=False,
+        methods=['POST', ],
+        permission_classes=(permissions.IsAdminUser, ),
+        parser_classes=(NDJSONParser, ),
+    )
+    def bulk(self, request, **kwargs):
+        """
+        Загрузка рецептов из NDJSON (application/x-ndjson), по рецепту
+        в строке, формат - как у export.ndjson. Тело читается
+        построчно, рецепты записываются пачками. В ответе id созданных
+        рецептов и ошибки по номерам строк, строки с ошибками
+        пропускаются.
+        """
+        result = import_recipes(request.data, request.user)
+        return Response(
+            result,
+            status=(
+                status.HTTP_201_CREATED if result['created']
+                else status.HTTP_400_BAD_REQUEST
+            ),
         )
-        return get_report(ingrediend_list)
 
     @action(
         detail=True,
@@ -127,6 +390,23 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return self._add_item(ShoppingCartSerializer, request, **kwargs)
         return self._delete_item(ShoppingCart, request, **kwargs)
 
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE', ],
+        url_path='shopping_cart',
+        url_name='shopping-cart-bulk',
+        permission_classes=(permissions.IsAuthenticated, ),
+    )
+    def shopping_cart_bulk(self, request, **kwargs):
+        """
+        Добавить в список покупок или убрать из него несколько
+        рецептов: {"ids": [1, 2, 3]}. В ответе статус по каждому id:
+        added, exists, deleted, missing или not_found.
+        """
+        if request.method == 'POST':
+            return self._add_items(ShoppingCart, request)
+        return self._delete_items(ShoppingCart, request)
+
     @action(
         detail=True,
         methods=['POST', 'DELETE'],
@@ -142,8 +422,64 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return self._add_item(FavoriteSerializer, request, **kwargs)
         return self._delete_item(Favorite, request, **kwargs)
 
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE', ],
+        url_path='favorite',
+        url_name='favorite-bulk',
+        permission_classes=(permissions.IsAuthenticated, ),
+    )
+    def favorite_bulk(self, request, **kwargs):
+        """
+        Добавить в избранное или убрать из него несколько рецептов,
+        формат - как у shopping_cart_bulk.
+        """
+        if request.method == 'POST':
+            return self._add_items(Favorite, request)
+        return self._delete_items(Favorite, request)
+
+
+class RecipeExportView(APIView):
+    """
+    GET /recipes/export.ndjson - все рецепты строками NDJSON,
+    таблица читается по частям. Только для staff.
+    Отдельный view, а не action: адрес recipes/export.ndjson роутер
+    разобрал бы как recipes/{pk}.{format}.
+    """
+    permission_classes = (permissions.IsAdminUser, )
+    renderer_classes = (NDJSONRenderer, JSONRenderer)
+
+    def get(self, request):
+        response = StreamingHttpResponse(
+            iter_export(Recipe.objects.all()),
+            content_type=NDJSONRenderer.media_type,
+        )
+        response['Content-Disposition'] = (
+            'attachment; filename="recipes.ndjson"'
+        )
+        return response
+
+
+class CatalogViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Справочник: список отдаётся уже сериализованным из catalog,
+    ETag меняется вместе с версией справочника.
+    """
+    catalog = None
+
+    def get_conditional_stamp(self, request, *args, **kwargs):
+        return (get_version(self.catalog.version_key), ), None
+
+    def _list_catalog(self, request, *args, **kwargs):
+        return Response(self.filter_queryset(self.catalog.items()))
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self._list_catalog, request, *args, **kwargs
+        )
+
 
-class TagsViewSet(viewsets.ReadOnlyModelViewSet):
+class TagsViewSet(CatalogViewSet):
     """
     GET /tags/ - список тегов приложения.
     Только гет запросы.
@@ -152,15 +488,17 @@ class TagsViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = TagSerializer
     permission_classes = (permissions.AllowAny,)
     pagination_class = None
+    catalog = tag_catalog
 
 
-class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientsViewSet(CatalogViewSet):
     """
     Список ингредиентов.
     Список ингредиентов с возможностью поиска по имени.
+    Поиск (?name=) идёт по индексу в памяти, см. catalog.py.
     """
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
-    filter_backends = (filters.SearchFilter, )
-    search_fields = ['^name', ]
+    filter_backends = (IngredientSearchFilter, )
+    catalog = ingredient_catalog
@@ -0,0 +1,111 @@
+"""
+Тесты API. Запускаются из backend/ с тем же окружением, что и сервер
+в режиме разработки (SQLite):
+SECRET_KEY=... DEBUG=True ALLOWED_HOSTS=* pytest
+"""
+import pytest
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.search import update_search_index
+
+
+@pytest.fixture(autouse=True)
+def isolated(settings, tmp_path):
+    """Свой MEDIA_ROOT, фоновые задачи сразу и пустой кеш на тест."""
+    settings.MEDIA_ROOT = str(tmp_path / 'media')
+    settings.BACKGROUND_EXECUTOR = 'sync'
+    cache.clear()
+
+
+@pytest.fixture
+def user(django_user_model):
+    return django_user_model.objects.create_user(
+        email='cook@example.com',
+        username='cook',
+        first_name='Повар',
+        last_name='Поваров',
+        password='secret-pass-123',
+    )
+
+
+@pytest.fixture
+def other(django_user_model):
+    return django_user_model.objects.create_user(
+        email='guest@example.com',
+        username='guest',
+        first_name='Гость',
+        last_name='Гостев',
+        password='secret-pass-123',
+    )
+
+
+@pytest.fixture
+def anon_client():
+    return APIClient()
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def staff_client(user):
+    user.is_staff = True
+    user.save()
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def tags(db):
+    return [
+        Tag.objects.create(name=slug, color='#000000', slug=slug)
+        for slug in ('breakfast', 'dinner', 'lunch')
+    ]
+
+
+@pytest.fixture
+def ingredients(db):
+    return [
+        Ingredient.objects.create(name=name, measurement_unit='г')
+        for name in ('абрикосы', 'мука', 'соль', 'сахар', 'яйца')
+    ]
+
+
+@pytest.fixture
+def make_recipes(tags, ingredients, user, other):
+    """
+    Рецепты по очереди от user и other, с тегами и составом,
+    в поисковом индексе - как после создания через API.
+    """
+    def make(count: int) -> list:
+        recipes = []
+        for number in range(count):
+            recipe = Recipe.objects.create(
+                author=(user, other)[number % 2],
+                name=f'Рецепт {number}',
+                text='Описание',
+                cooking_time=10,
+            )
+            recipe.tags.set(tags[:2])
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(
+                    recipe=recipe, ingredient=ingredient, amount=number + 1
+                )
+                for ingredient in ingredients[:3]
+            ])
+            recipes.append(recipe)
+        update_search_index([recipe.pk for recipe in recipes])
+        return recipes
+    return make
+
+
+@pytest.fixture
+def recipes(make_recipes):
+    return make_recipes(12)
@@ -0,0 +1,56 @@
+"""
+Бюджеты API на данных seed_bench: число запросов к базе и p90 времени
+ответа по адресам bench_api. Долгие и зависят от машины, поэтому
+по умолчанию пропускаются, запуск: BENCH=1 pytest tests/test_bench.py
+"""
+import os
+
+import pytest
+from django.core.management import call_command
+
+from recipes.management.commands.bench_api import ENDPOINTS, Command
+from recipes.management.seed import ensure_catalog, seed
+
+pytestmark = [
+    pytest.mark.bench,
+    pytest.mark.skipif(
+        not os.getenv('BENCH'), reason='BENCH=1 включает замеры.'
+    ),
+]
+
+# Адрес bench_api: (запросов к базе не больше, p90 в мс не больше).
+# Замер после прогрева, как в bench_api: кеши фрагментов уже собраны.
+BUDGETS = {
+    'recipes': (5, 50),
+    'recipes page 50': (5, 50),
+    'recipes cursor': (4, 50),
+    'recipes tags': (6, 80),
+    'recipes user': (6, 80),
+    'recipes favorited': (6, 80),
+    'download_shopping_cart txt': (2, 30),
+    'download_shopping_cart txt cold': (2, 30),
+    'download_shopping_cart pdf cold': (2, 100),
+    'subscriptions': (4, 80),
+}
+OPTIONS = {'warmup': 3, 'repeat': 20}
+
+
+@pytest.fixture(scope='module')
+def bench_clients(django_db_setup, django_db_blocker):
+    """Данные seed_bench на модуль, после него база очищается."""
+    with django_db_blocker.unblock():
+        ensure_catalog(200)
+        seed(users=100, recipes=1000, random_seed=0)
+        yield Command().get_clients(10, 0)
+        call_command('flush', interactive=False, verbosity=0)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    'endpoint', ENDPOINTS, ids=[endpoint.name for endpoint in ENDPOINTS]
+)
+def test_budget(bench_clients, endpoint):
+    max_queries, p90 = BUDGETS[endpoint.name]
+    result = Command().measure(endpoint, bench_clients, OPTIONS)
+    assert result['max_queries'] <= max_queries
+    assert result['p90'] <= p90
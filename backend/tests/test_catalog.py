@@ -0,0 +1,80 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.catalog import ingredient_catalog, tag_catalog
+from recipes.models import Ingredient
+
+
+def get(client, url):
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(url)
+    assert response.status_code == 200
+    return response.json(), len(context)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('catalog, fixture', [
+    (tag_catalog, 'tags'), (ingredient_catalog, 'ingredients'),
+])
+def test_catalog_snapshot_hits(
+    request, django_assert_num_queries, catalog, fixture
+):
+    objects = request.getfixturevalue(fixture)
+    snapshot = catalog.snapshot()
+    assert set(snapshot) == {obj.pk for obj in objects}
+    # Версия справочника не менялась: ни одного запроса к базе.
+    with django_assert_num_queries(0):
+        assert catalog.snapshot() is snapshot
+        assert catalog.items() == list(snapshot.values())
+    objects[0].name = 'новое название'
+    objects[0].save()
+    fresh = catalog.snapshot()
+    assert fresh is not snapshot
+    assert fresh[objects[0].pk]['name'] == 'новое название'
+
+
+@pytest.mark.django_db
+def test_ingredient_list_served_from_catalog(
+    anon_client, ingredients, django_assert_num_queries
+):
+    anon_client.get('/api/ingredients/')
+    with django_assert_num_queries(0):
+        response = anon_client.get('/api/ingredients/')
+    assert [item['name'] for item in response.json()] == [
+        ingredient.name for ingredient in ingredients
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('rename', ['tag', 'ingredient', 'author'])
+def test_rename_invalidates_fragment(anon_client, recipes, rename):
+    recipe = recipes[0]
+    url = f'/api/recipes/{recipe.pk}/'
+    data, queries = get(anon_client, url)
+    cached, cached_queries = get(anon_client, url)
+    # Фрагмент из кеша: теги и состав не выбираются.
+    assert cached == data
+    assert cached_queries < queries
+    if rename == 'tag':
+        tag = recipe.tags.order_by('pk').first()
+        tag.name = 'Переименованный тег'
+        tag.save()
+        expected = data['tags'][0]['name'] = 'Переименованный тег'
+    elif rename == 'ingredient':
+        ingredient = Ingredient.objects.get(
+            pk=data['ingredients'][0]['id']
+        )
+        ingredient.name = 'переименованный ингредиент'
+        ingredient.save()
+        expected = 'переименованный ингредиент'
+        data['ingredients'][0]['name'] = expected
+    else:
+        recipe.author.first_name = 'Шеф'
+        recipe.author.save()
+        expected = data['author']['first_name'] = 'Шеф'
+    fresh, fresh_queries = get(anon_client, url)
+    assert expected in str(fresh)
+    assert fresh == data
+    # Фрагмент собран заново, а не взят из кеша.
+    assert fresh_queries > cached_queries
@@ -0,0 +1,15 @@
+from recipes.checks import LOCMEM_CACHE, check_shared_cache
+
+
+def test_locmem_cache_warning(settings):
+    settings.CACHES = {'default': {'BACKEND': LOCMEM_CACHE}}
+    settings.DEBUG = True
+    assert check_shared_cache(None) == []
+    settings.DEBUG = False
+    assert [
+        warning.id for warning in check_shared_cache(None)
+    ] == ['recipes.W001']
+    settings.CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    }}
+    assert check_shared_cache(None) == []
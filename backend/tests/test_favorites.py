@@ -0,0 +1,143 @@
+import pytest
+
+from recipes.models import COUNTER_FIELDS, Favorite, Recipe, ShoppingCart
+from recipes.views import RecipeViewSet
+
+LINKS = (
+    pytest.param('favorite', Favorite, id='favorite'),
+    pytest.param('shopping_cart', ShoppingCart, id='shopping_cart'),
+)
+
+
+def counters(model, recipes) -> list:
+    field = COUNTER_FIELDS[model]
+    return [
+        getattr(recipe, field)
+        for recipe in Recipe.objects.filter(
+            pk__in=[recipe.pk for recipe in recipes]
+        ).order_by('pk')
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('path, model', LINKS)
+def test_bulk_add_and_delete(user_client, user, recipes, path, model):
+    url = f'/api/recipes/{path}/'
+    response = user_client.post(
+        url, {'ids': [recipes[0].pk, recipes[1].pk, 0]}, format='json'
+    )
+    assert response.status_code == 400
+    response = user_client.post(
+        url,
+        {'ids': [recipes[0].pk, recipes[1].pk, 999999, recipes[0].pk]},
+        format='json',
+    )
+    assert response.status_code == 200
+    assert [
+        (item['id'], item['status']) for item in response.json()['results']
+    ] == [
+        (recipes[0].pk, 'added'),
+        (recipes[1].pk, 'added'),
+        (999999, 'not_found'),
+    ]
+    assert counters(model, recipes[:2]) == [1, 1]
+    response = user_client.delete(
+        url, {'ids': [recipes[0].pk, recipes[2].pk]}, format='json'
+    )
+    assert [
+        item['status'] for item in response.json()['results']
+    ] == ['deleted', 'missing']
+    assert counters(model, recipes[:3]) == [0, 1, 0]
+    assert list(
+        model.objects.filter(user=user).values_list('recipe_id', flat=True)
+    ) == [recipes[1].pk]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('path, model', LINKS)
+def test_bulk_queries_do_not_grow(
+    user_client, make_recipes, django_assert_max_num_queries, path, model
+):
+    url = f'/api/recipes/{path}/'
+    for count in (2, 20):
+        ids = [recipe.pk for recipe in make_recipes(count)]
+        # Рецепты с флагами, блокировка пользователя, его связи,
+        # вставка и счётчики, плюс SAVEPOINT/RELEASE.
+        with django_assert_max_num_queries(7):
+            user_client.post(url, {'ids': ids}, format='json')
+        # Удаление ещё блокирует строки связей, а delete() выбирает
+        # удаляемые строки одним запросом.
+        with django_assert_max_num_queries(7):
+            user_client.delete(url, {'ids': ids}, format='json')
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('path, model', LINKS)
+def test_bulk_delete_after_concurrent_delete(
+    user_client, user, other, recipes, monkeypatch, path, model
+):
+    url = f'/api/recipes/{path}/'
+    # Связь другого пользователя: счётчик не упрётся в ноль.
+    model.objects.create(user=other, recipe=recipes[0])
+    user_client.post(url, {'ids': [recipes[0].pk]}, format='json')
+    get_bulk_recipes = RecipeViewSet._get_bulk_recipes
+
+    def concurrent_delete(self, model, request):
+        result = get_bulk_recipes(self, model, request)
+        # Параллельный запрос успел удалить ту же связь.
+        model.objects.filter(user=user, recipe=recipes[0]).delete()
+        return result
+
+    monkeypatch.setattr(
+        RecipeViewSet, '_get_bulk_recipes', concurrent_delete
+    )
+    response = user_client.delete(
+        url, {'ids': [recipes[0].pk]}, format='json'
+    )
+    assert response.status_code == 200
+    assert response.json()['results'][0]['status'] == 'missing'
+    assert counters(model, recipes[:1]) == [1]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('path, model', LINKS)
+def test_single_add_and_delete(
+    user_client, recipes, django_capture_on_commit_callbacks, path, model
+):
+    url = f'/api/recipes/{recipes[0].pk}/{path}/'
+    with django_capture_on_commit_callbacks(execute=True):
+        assert user_client.post(url).status_code == 201
+    assert user_client.post(url).status_code == 400
+    assert counters(model, recipes[:1]) == [1]
+    assert user_client.delete(url).status_code == 204
+    assert user_client.delete(url).status_code == 400
+    assert counters(model, recipes[:1]) == [0]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('path, model', LINKS)
+def test_bulk_add_after_concurrent_add(
+    user_client, user, recipes, monkeypatch, path, model
+):
+    url = f'/api/recipes/{path}/'
+    get_bulk_recipes = RecipeViewSet._get_bulk_recipes
+
+    def concurrent_add(self, model, request):
+        result = get_bulk_recipes(self, model, request)
+        # Параллельный запрос успел добавить ту же связь.
+        model.objects.create(user=user, recipe=recipes[0])
+        return result
+
+    monkeypatch.setattr(RecipeViewSet, '_get_bulk_recipes', concurrent_add)
+    response = user_client.post(
+        url, {'ids': [recipes[0].pk, recipes[1].pk]}, format='json'
+    )
+    assert [
+        item['status'] for item in response.json()['results']
+    ] == ['exists', 'added']
+    assert counters(model, recipes[:2]) == [1, 1]
+    monkeypatch.undo()
+    user_client.post(
+        url, {'ids': [recipes[0].pk, recipes[1].pk]}, format='json'
+    )
+    assert counters(model, recipes[:2]) == [1, 1]
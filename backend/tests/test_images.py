@@ -0,0 +1,126 @@
+import base64
+import io
+import os
+import time
+from io import StringIO
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from PIL import Image
+from rest_framework import serializers
+
+from recipes import images
+from recipes.fields import Base64ImageField
+from recipes.images import get_thumbnail_name
+from recipes.models import Recipe
+
+URL = '/api/recipes/'
+
+
+def png(size, color='red') -> bytes:
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def data_uri(content: bytes) -> str:
+    return 'data:image/png;base64,' + base64.b64encode(content).decode()
+
+
+def create(client, tags, ingredients, image, name='Рецепт'):
+    return client.post(URL, {
+        'tags': [tags[0].pk],
+        'ingredients': [{'id': ingredients[0].pk, 'amount': 10}],
+        'image': image,
+        'name': name,
+        'text': 'Описание',
+        'cooking_time': 10,
+    }, format='json')
+
+
+def stored_images() -> list:
+    return sorted(default_storage.listdir('images')[1])
+
+
+def make_old(name: str) -> None:
+    stale = time.time() - 2 * 60 * 60
+    os.utime(default_storage.path(name), (stale, stale))
+
+
+@pytest.mark.django_db
+def test_upload_is_bounded_and_thumbnailed(
+    user_client, tags, ingredients, django_capture_on_commit_callbacks
+):
+    with django_capture_on_commit_callbacks(execute=True):
+        response = create(
+            user_client, tags, ingredients, data_uri(png((2000, 1000)))
+        )
+    assert response.status_code == 201
+    recipe = Recipe.objects.get(pk=response.json()['id'])
+    with Image.open(default_storage.path(recipe.image.name)) as image:
+        assert (image.format, image.size) == ('PNG', (1600, 800))
+    thumbnail_name = get_thumbnail_name(recipe.image.name)
+    with Image.open(default_storage.path(thumbnail_name)) as image:
+        assert (image.format, image.size) == ('WEBP', (480, 240))
+    result = user_client.get(URL).json()['results'][0]
+    assert result['image'].endswith(thumbnail_name)
+
+
+@pytest.mark.django_db
+def test_same_upload_stored_once(user_client, tags, ingredients):
+    image = data_uri(png((8, 8)))
+    for name in ('Первый', 'Второй'):
+        response = create(user_client, tags, ingredients, image, name)
+        assert response.status_code == 201
+    names = set(Recipe.objects.values_list('image', flat=True))
+    assert len(names) == 1
+    assert [
+        name for name in stored_images() if name.endswith('.png')
+    ] == [os.path.basename(names.pop())]
+
+
+@pytest.mark.django_db
+def test_oversized_image_rejected_before_decoding(
+    user_client, tags, ingredients, settings, monkeypatch
+):
+    content = png((64, 64))
+    settings.RECIPE_IMAGE_MAX_BYTES = len(content) - 1
+
+    def decode(data):
+        raise AssertionError('Картинка не должна декодироваться.')
+
+    monkeypatch.setattr(images.binascii, 'a2b_base64', decode)
+    response = create(user_client, tags, ingredients, data_uri(content))
+    assert response.status_code == 400
+    assert 'image' in response.json()
+    assert not Recipe.objects.exists()
+    with pytest.raises(serializers.ValidationError):
+        Base64ImageField().to_internal_value(
+            SimpleUploadedFile('image.png', content, 'image/png')
+        )
+
+
+@pytest.mark.django_db
+def test_clean_images_removes_only_orphans(recipes):
+    used = default_storage.save('images/used.png', ContentFile(png((8, 8))))
+    Recipe.objects.filter(pk=recipes[0].pk).update(image=used)
+    used_thumbnail = default_storage.save(
+        get_thumbnail_name(used), ContentFile(b'webp')
+    )
+    orphan = default_storage.save('images/orphan.png', ContentFile(b'png'))
+    orphan_thumbnail = default_storage.save(
+        get_thumbnail_name(orphan), ContentFile(b'webp')
+    )
+    for name in (used, used_thumbnail, orphan, orphan_thumbnail):
+        make_old(name)
+    # Только что сохранённая картинка может ждать свой рецепт.
+    fresh = default_storage.save('images/fresh.png', ContentFile(b'png'))
+    call_command('clean_images', '--dry-run', stdout=StringIO())
+    assert len(stored_images()) == 5
+    call_command('clean_images', stdout=StringIO())
+    assert stored_images() == sorted(
+        os.path.basename(name) for name in (used, used_thumbnail, fresh)
+    )
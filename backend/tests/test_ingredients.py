@@ -0,0 +1,49 @@
+import pytest
+
+from recipes.models import Ingredient
+
+URL = '/api/ingredients/'
+
+
+@pytest.fixture
+def catalog(ingredients):
+    return ingredients + [
+        Ingredient.objects.create(name=name, measurement_unit='г')
+        for name in ('Сахарная пудра', 'колбаса', 'васаби', 'Ёжевика')
+    ]
+
+
+def search(client, **params) -> list:
+    response = client.get(URL, params)
+    assert response.status_code == 200
+    return [item['name'] for item in response.json()]
+
+
+@pytest.mark.django_db
+def test_prefix_matches_before_contains(anon_client, catalog):
+    # Сначала начало названия по алфавиту, затем вхождение в середине.
+    assert search(anon_client, name='СА') == [
+        'сахар', 'Сахарная пудра', 'васаби', 'колбаса',
+    ]
+    assert search(anon_client, name='ежев') == ['Ёжевика']
+    assert search(anon_client, name='пудр') == ['Сахарная пудра']
+    assert search(anon_client, name='кефир') == []
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('limit, expected', [
+    ('2', ['сахар', 'Сахарная пудра']),
+    ('3', ['сахар', 'Сахарная пудра', 'васаби']),
+    # Ноль и отрицательные значения приводятся к одному результату.
+    ('0', ['сахар']),
+    ('-5', ['сахар']),
+    ('много', ['сахар', 'Сахарная пудра', 'васаби', 'колбаса']),
+])
+def test_search_limit(anon_client, catalog, limit, expected):
+    assert search(anon_client, name='са', limit=limit) == expected
+
+
+@pytest.mark.django_db
+def test_search_limit_capped(anon_client, catalog, settings):
+    settings.INGREDIENT_SEARCH_LIMIT = 3
+    assert len(search(anon_client, name='а', limit=100)) == 3
@@ -0,0 +1,40 @@
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from recipes.models import Ingredient
+
+ROWS = [
+    {'name': 'абрикосы', 'measurement_unit': 'г'},
+    {'name': 'мука', 'measurement_unit': 'г'},
+    {'name': 'мука', 'measurement_unit': 'кг'},
+    # Дубль внутри файла тоже не создаёт второй ингредиент.
+    {'name': 'абрикосы', 'measurement_unit': 'г'},
+    {'name': 'соль', 'measurement_unit': 'ч. л.'},
+]
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    path = tmp_path / 'ingredients.json'
+    path.write_text(json.dumps(ROWS, ensure_ascii=False), encoding='utf-8')
+    return str(path)
+
+
+@pytest.mark.django_db
+def test_load_catalog_is_idempotent(catalog):
+    call_command('load_catalog', catalog, '--batch-size', '2',
+                 stdout=StringIO())
+    loaded = sorted(Ingredient.objects.values_list(
+        'name', 'measurement_unit'
+    ))
+    assert len(loaded) == 4
+    stdout = StringIO()
+    call_command('load_catalog', catalog, '--batch-size', '2',
+                 stdout=stdout)
+    assert 'добавлено ингредиентов: 0' in stdout.getvalue()
+    assert sorted(Ingredient.objects.values_list(
+        'name', 'measurement_unit'
+    )) == loaded
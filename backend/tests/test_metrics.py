@@ -0,0 +1,47 @@
+import pytest
+from rest_framework.test import APIClient
+
+URL = '/api/_metrics'
+
+
+@pytest.mark.django_db
+def test_metrics_middleware_is_off_by_default(anon_client, tags):
+    response = anon_client.get('/api/tags/')
+    assert response.status_code == 200
+    assert 'Server-Timing' not in response
+
+
+@pytest.mark.django_db
+def test_metrics_middleware_server_timing(settings, user, tags):
+    settings.API_METRICS = True
+    # Middleware подключается при первом запросе клиента.
+    client = APIClient()
+    response = client.get('/api/tags/')
+    assert response.status_code == 200
+    timing = response['Server-Timing']
+    for name in ('db', 'app', 'render', 'total'):
+        assert f'{name};dur=' in timing
+    assert 'SQL"' in timing
+    user.is_staff = True
+    user.save()
+    client.force_authenticate(user)
+    response = client.get(URL)
+    assert response.status_code == 200
+    assert (
+        'foodgram_requests_total{view="tags-list",method="GET",status="200"}'
+        in response.content.decode()
+    )
+
+
+@pytest.mark.django_db
+def test_metrics_view_for_staff_only(anon_client, staff_client, other):
+    assert anon_client.get(URL).status_code == 401
+    client = APIClient()
+    client.force_authenticate(other)
+    assert client.get(URL).status_code == 403
+    response = staff_client.get(URL)
+    assert response.status_code == 200
+    assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+    body = response.content.decode()
+    assert '# TYPE foodgram_request_duration_seconds histogram' in body
+    assert 'foodgram_shopping_cart_cache_total' in body
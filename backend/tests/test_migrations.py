@@ -0,0 +1,52 @@
+import pytest
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+
+BEFORE = [('recipes', '0007_recipe_updated_at')]
+AFTER = [('recipes', '0009_ingredient_unique')]
+
+
+def migrate(targets):
+    executor = MigrationExecutor(connection)
+    executor.loader.build_graph()
+    executor.migrate(targets)
+    return executor.loader.project_state(targets).apps
+
+
+@pytest.mark.django_db(transaction=True)
+def test_merge_duplicate_ingredients_adds_amounts(user):
+    apps = migrate(BEFORE)
+    try:
+        Ingredient = apps.get_model('recipes', 'Ingredient')
+        Recipe = apps.get_model('recipes', 'Recipe')
+        RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+        keep, duplicate = (
+            Ingredient.objects.create(name='соль', measurement_unit='г')
+            for _ in range(2)
+        )
+        both, only_duplicate = (
+            Recipe.objects.create(
+                author_id=user.pk, name=name, text='Описание',
+                cooking_time=10, image='recipes/images/test.png',
+            )
+            for name in ('Оба', 'Дубль')
+        )
+        RecipeIngredient.objects.create(
+            recipe=both, ingredient=keep, amount=5
+        )
+        RecipeIngredient.objects.create(
+            recipe=both, ingredient=duplicate, amount=7
+        )
+        RecipeIngredient.objects.create(
+            recipe=only_duplicate, ingredient=duplicate, amount=3
+        )
+    finally:
+        apps = migrate(AFTER)
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    assert list(Ingredient.objects.values_list('pk', flat=True)) == [keep.pk]
+    assert sorted(RecipeIngredient.objects.values_list(
+        'recipe_id', 'ingredient_id', 'amount'
+    )) == sorted([
+        (both.pk, keep.pk, 12), (only_duplicate.pk, keep.pk, 3),
+    ])
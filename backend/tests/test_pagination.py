@@ -0,0 +1,59 @@
+import pytest
+
+from recipes.models import Recipe
+
+
+def walk(client, params: dict) -> list:
+    """id рецептов со всех страниц курсорной выдачи."""
+    ids = []
+    url = '/api/recipes/'
+    params = {**params, 'pagination': 'cursor', 'limit': 5}
+    while url:
+        response = client.get(url, params)
+        assert response.status_code == 200
+        data = response.json()
+        ids.extend(recipe['id'] for recipe in data['results'])
+        url, params = data['next'], None
+    return ids
+
+
+def offset_ids(client, params: dict) -> list:
+    return [
+        recipe['id'] for recipe in client.get(
+            '/api/recipes/', {**params, 'limit': 100}
+        ).json()['results']
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('params', (
+    {},
+    {'ordering': '-favorites_count'},
+    {'ordering': 'carts_count'},
+    {'search': 'рецепт'},
+    {'have': '{0},{1}'},
+))
+def test_cursor_keeps_active_ordering(
+    anon_client, recipes, ingredients, params
+):
+    params = {
+        name: value.format(*(ingredient.pk for ingredient in ingredients))
+        for name, value in params.items()
+    }
+    # Равные значения счётчиков на границах страниц.
+    for number, recipe in enumerate(recipes):
+        Recipe.objects.filter(pk=recipe.pk).update(
+            favorites_count=number % 3, carts_count=number % 2
+        )
+    expected = offset_ids(anon_client, params)
+    assert len(expected) == len(recipes)
+    assert walk(anon_client, params) == expected
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('params', ({}, {'search': 'рецепт'}))
+def test_invalid_cursor(anon_client, recipes, params):
+    response = anon_client.get(
+        '/api/recipes/', {**params, 'pagination': 'cursor', 'cursor': 'e30'}
+    )
+    assert response.status_code == 404
@@ -0,0 +1,206 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+
+def count_queries(client, url) -> int:
+    """Запросы к базе на пустом кеше: фрагменты собираются заново."""
+    cache.clear()
+    with CaptureQueriesContext(connection) as context:
+        assert client.get(url).status_code == 200
+    return len(context)
+
+
+@pytest.mark.django_db
+def test_list_flags_in_constant_queries(user_client, user, recipes):
+    Favorite.objects.create(user=user, recipe=recipes[-1])
+    ShoppingCart.objects.create(user=user, recipe=recipes[-2])
+    # Подсчёт, страница, теги, состав, справочник тегов и подписки.
+    assert [
+        count_queries(user_client, f'/api/recipes/?limit={limit}')
+        for limit in (2, 10)
+    ] == [6, 6]
+    results = user_client.get('/api/recipes/?limit=3').json()['results']
+    assert [
+        (recipe['is_favorited'], recipe['is_in_shopping_cart'])
+        for recipe in results
+    ] == [(True, False), (False, True), (False, False)]
+
+
+@pytest.mark.django_db
+def test_anonymous_page_costs_fixed_queries(anon_client, recipes):
+    # Подсчёт или штамп ETag, рецепты с авторами, теги, состав
+    # и справочник тегов.
+    assert [
+        count_queries(anon_client, f'/api/recipes/?limit={limit}')
+        for limit in (1, 5, 12)
+    ] == [5, 5, 5]
+    assert count_queries(anon_client, f'/api/recipes/{recipes[0].pk}/') == 5
+
+
+@pytest.mark.django_db
+def test_same_second_edit_is_not_304(anon_client, recipes):
+    recipe = recipes[0]
+    url = f'/api/recipes/{recipe.pk}/'
+    edited = datetime(2026, 1, 1, 12, 0, 0, 100000, tzinfo=timezone.utc)
+    Recipe.objects.filter(pk=recipe.pk).update(updated_at=edited)
+    response = anon_client.get(url)
+    last_modified = response['Last-Modified']
+    # Вторая правка в ту же секунду: Last-Modified тот же, ETag новый.
+    Recipe.objects.filter(pk=recipe.pk).update(
+        name='Новое название',
+        updated_at=edited + timedelta(microseconds=500000),
+    )
+    response = anon_client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+    assert response.status_code == 200
+    assert response['Last-Modified'] == last_modified
+    assert response.json()['name'] == 'Новое название'
+    assert anon_client.get(
+        url,
+        HTTP_IF_NONE_MATCH=response['ETag'],
+        HTTP_IF_MODIFIED_SINCE=last_modified,
+    ).status_code == 304
+
+
+@pytest.mark.django_db
+def test_detail_etag(
+    user_client, recipes, django_assert_num_queries,
+    django_capture_on_commit_callbacks,
+):
+    url = f'/api/recipes/{recipes[0].pk}/'
+    response = user_client.get(url)
+    etag = response['ETag']
+    assert not response.json()['is_favorited']
+    # Штамп ETag считается до выборки рецепта.
+    with django_assert_num_queries(1):
+        response = user_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    with django_capture_on_commit_callbacks(execute=True):
+        user_client.post(f'{url}favorite/')
+    response = user_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response['ETag'] != etag
+    assert response.json()['is_favorited']
+    assert user_client.get(
+        url, HTTP_IF_NONE_MATCH=response['ETag']
+    ).status_code == 304
+
+
+def payload(recipe, **changes) -> dict:
+    data = {
+        'tags': list(recipe.tags.values_list('pk', flat=True)),
+        'ingredients': [
+            {'id': row.ingredient_id, 'amount': row.amount}
+            for row in recipe.ingredients_used.all()
+        ],
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+    }
+    data.update(changes)
+    return data
+
+
+def writes(context) -> list:
+    return [
+        query['sql'] for query in context.captured_queries
+        if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+    ]
+
+
+@pytest.mark.django_db
+def test_patch_writes_only_changes(user_client, recipes, ingredients):
+    recipe = recipes[0]
+    url = f'/api/recipes/{recipe.pk}/'
+    # Поиск, теги и состав не меняются - только UPDATE рецепта.
+    with CaptureQueriesContext(connection) as context:
+        response = user_client.patch(
+            url, payload(recipe, cooking_time=25), format='json'
+        )
+    assert response.status_code == 200
+    assert response.json()['cooking_time'] == 25
+    statements = writes(context)
+    assert len(statements) == 1
+    assert statements[0].startswith('UPDATE "recipes_recipe" SET')
+    recipe.refresh_from_db()
+    # Одна строка состава меняется, одна уходит, одна добавляется.
+    data = payload(recipe)
+    data['ingredients'][0]['amount'] = 7
+    data['ingredients'][1] = {'id': ingredients[4].pk, 'amount': 3}
+    with CaptureQueriesContext(connection) as context:
+        response = user_client.patch(url, data, format='json')
+    assert response.status_code == 200
+    assert [
+        statement.split(' ', 1)[0] for statement in writes(context)
+        if 'recipes_recipeingredient' in statement
+    ] == ['DELETE', 'UPDATE', 'INSERT']
+    # Сигналы строк состава не срабатывают: рецепт обновляется один раз.
+    assert len([
+        statement for statement in writes(context)
+        if statement.startswith('UPDATE "recipes_recipe" ')
+    ]) == 1
+    assert not [
+        statement for statement in writes(context)
+        if 'recipes_recipe_tags' in statement
+    ]
+
+
+@pytest.mark.django_db
+def test_patch_ingredient_row_errors(user_client, recipes, ingredients):
+    data = payload(recipes[0])
+    data['ingredients'] = [
+        {'amount': 3},
+        {'id': 999999, 'amount': 1},
+        {'id': ingredients[0].pk},
+        {'id': ingredients[1].pk, 'amount': 2},
+    ]
+    response = user_client.patch(
+        f'/api/recipes/{recipes[0].pk}/', data, format='json'
+    )
+    assert response.status_code == 400
+    assert response.json()['ingredients'] == [
+        {'id': ['Обязательное поле.']},
+        {'id': ['Недопустимый первичный ключ "999999" - объект не существует.']},
+        {'amount': ['Обязательное поле.']},
+        {},
+    ]
+
+
+def links(recipe) -> tuple:
+    return (
+        sorted(recipe.tags.values_list('pk', flat=True)),
+        sorted(
+            recipe.ingredients_used.values_list('ingredient_id', 'amount')
+        ),
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('fields', (
+    ('cooking_time', ),
+    ('cooking_time', 'ingredients'),
+    ('cooking_time', 'tags'),
+))
+def test_partial_patch_keeps_missing_links(user_client, recipes, fields):
+    recipe = recipes[0]
+    before = links(recipe)
+    data = payload(recipe, cooking_time=5)
+    with CaptureQueriesContext(connection) as context:
+        response = user_client.patch(
+            f'/api/recipes/{recipe.pk}/',
+            {field: data[field] for field in fields},
+            format='json',
+        )
+    assert response.status_code == 200
+    assert response.json()['cooking_time'] == 5
+    assert links(recipe) == before
+    assert [
+        statement for statement in writes(context)
+        if 'recipes_recipe_tags' in statement
+        or 'recipes_recipeingredient' in statement
+    ] == []
@@ -0,0 +1,93 @@
+import pytest
+
+from recipes.catalog import coverage_index
+from recipes.models import Recipe, RecipeIngredient
+from recipes.search import update_search_index
+
+URL = '/api/recipes/'
+
+
+@pytest.fixture
+def make_recipe(user, ingredients):
+    by_name = {ingredient.name: ingredient for ingredient in ingredients}
+
+    def make(name: str, text: str, used: tuple) -> Recipe:
+        recipe = Recipe.objects.create(
+            author=user, name=name, text=text, cooking_time=10
+        )
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe=recipe, ingredient=by_name[ingredient], amount=1
+            )
+            for ingredient in used
+        ])
+        update_search_index([recipe.pk])
+        return recipe
+    return make
+
+
+def names(client, **params) -> list:
+    response = client.get(URL, {'limit': 10, **params})
+    assert response.status_code == 200
+    return [recipe['name'] for recipe in response.json()['results']]
+
+
+def patch_ingredients(client, recipe, used) -> None:
+    response = client.patch(f'{URL}{recipe.pk}/', {
+        'ingredients': [
+            {'id': ingredient.pk, 'amount': 1} for ingredient in used
+        ],
+    }, format='json')
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_search_ranks_name_text_ingredients(
+    user_client, make_recipe, ingredients, django_capture_on_commit_callbacks
+):
+    make_recipe('Печенье с изюмом', 'Простое печенье', ('мука', 'сахар'))
+    make_recipe('Печенье', 'Печенье с сахаром', ('мука', ))
+    make_recipe('Сахарное печенье', 'Простое печенье', ('мука', ))
+    omelette = make_recipe('Омлет', 'Взбить яйца', ('яйца', ))
+    # Вес названия выше веса описания, а описания - выше состава.
+    assert names(user_client, search='сахар') == [
+        'Сахарное печенье', 'Печенье', 'Печенье с изюмом',
+    ]
+    assert names(user_client, search='пирог') == []
+    *_, sugar, eggs = ingredients
+    with django_capture_on_commit_callbacks(execute=True):
+        patch_ingredients(user_client, omelette, (eggs, sugar))
+    found = names(user_client, search='сахар')
+    assert found[:2] == ['Сахарное печенье', 'Печенье']
+    assert set(found[2:]) == {'Печенье с изюмом', 'Омлет'}
+
+
+@pytest.mark.django_db
+def test_have_ranks_by_coverage(
+    user_client, make_recipe, ingredients, monkeypatch,
+    django_capture_on_commit_callbacks,
+):
+    apricots, flour, salt, sugar, eggs = ingredients
+    make_recipe('Два из двух', '', ('мука', 'сахар'))
+    make_recipe('Три из трёх', '', ('мука', 'сахар', 'яйца'))
+    four = make_recipe('Три из четырёх', '', ('мука', 'соль', 'сахар', 'яйца'))
+    make_recipe('Один из двух', '', ('мука', 'абрикосы'))
+    make_recipe('Мимо', '', ('абрикосы', ))
+    have = ','.join(str(ingredient.pk) for ingredient in (flour, sugar, eggs))
+    # При равной доле выше рецепт, где совпало больше ингредиентов.
+    assert names(user_client, have=have) == [
+        'Три из трёх', 'Два из двух', 'Три из четырёх', 'Один из двух',
+    ]
+    # Индекс уже собран и догружает только изменённый рецепт.
+    monkeypatch.setattr(coverage_index, '_build', None)
+    with django_capture_on_commit_callbacks(execute=True):
+        patch_ingredients(user_client, four, (flour, sugar, eggs))
+    # Равные совпадение и доля - новый рецепт выше.
+    assert names(user_client, have=have) == [
+        'Три из четырёх', 'Три из трёх', 'Два из двух', 'Один из двух',
+    ]
+    with django_capture_on_commit_callbacks(execute=True):
+        patch_ingredients(user_client, four, (apricots, ))
+    assert names(user_client, have=have) == [
+        'Три из трёх', 'Два из двух', 'Один из двух',
+    ]
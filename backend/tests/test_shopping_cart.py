@@ -0,0 +1,173 @@
+import os
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.utils import timezone
+
+from recipes.models import (
+    Ingredient, RecipeIngredient, ShoppingCart, ShoppingCartExport
+)
+from recipes import services
+from recipes.services import PDFExporter, render_shopping_cart_export
+
+URL = '/api/recipes/download_shopping_cart/'
+
+
+def content(response) -> bytes:
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+@pytest.mark.django_db
+def test_download_async_only_on_flag(user_client, user, recipes):
+    ShoppingCart.objects.create(user=user, recipe=recipes[0])
+    response = user_client.get(URL, {'format': 'txt'})
+    assert response.status_code == 200
+    report = content(response)
+    assert 'абрикосы'.encode() in report
+    response = user_client.post(f'{URL}?format=txt')
+    assert response.status_code == 200
+    assert content(response) == report
+    assert not ShoppingCartExport.objects.exists()
+    response = user_client.post(f'{URL}?format=txt&async=1')
+    assert response.status_code == 202
+    export_id = response.json()['id']
+    response = user_client.get(f'{URL}{export_id}/')
+    assert response.status_code == 200
+    assert content(response) == report
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('export_format, content_type, header', [
+    ('csv', 'text/csv; charset=utf-8', 'Ингредиент,Количество'),
+    ('txt', 'text/plain; charset=utf-8', 'Список покупок'),
+])
+def test_download_text_formats(
+    user_client, user, recipes, export_format, content_type, header
+):
+    ShoppingCart.objects.create(user=user, recipe=recipes[0])
+    ShoppingCart.objects.create(user=user, recipe=recipes[2])
+    response = user_client.get(URL, {'format': export_format})
+    assert response.status_code == 200
+    assert response['Content-Type'] == content_type
+    assert response['Content-Disposition'] == (
+        f'attachment; filename="shopping_cart.{export_format}"'
+    )
+    report = content(response).decode('utf-8-sig')
+    assert report.startswith(header)
+    # Количества из двух рецептов складываются: 1 + 3.
+    assert 'абрикосы' in report and '4' in report
+
+
+@pytest.mark.django_db
+def test_download_pdf_spans_pages(user_client, user, recipes):
+    recipe = recipes[0]
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'продукт {number:03}', measurement_unit='г')
+        for number in range(80)
+    )
+    ingredients = Ingredient.objects.filter(name__startswith='продукт')
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=1)
+        for ingredient in ingredients
+    )
+    ShoppingCart.objects.create(user=user, recipe=recipe)
+    response = user_client.get(URL)
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'application/pdf'
+    report = content(response)
+    assert report.startswith(b'%PDF')
+    # Больше 80 строк по 20 пунктов не помещаются на одну страницу A4.
+    assert report.count(b'/Type /Page\n') >= 2
+
+
+@pytest.mark.django_db
+def test_download_accepts_json(user_client, user, recipes):
+    ShoppingCart.objects.create(user=user, recipe=recipes[0])
+    response = user_client.get(URL, HTTP_ACCEPT='application/json')
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'application/pdf'
+    assert content(response).startswith(b'%PDF')
+
+
+@pytest.mark.django_db
+def test_download_errors_are_json(anon_client, user_client, monkeypatch):
+    response = anon_client.get(URL)
+    assert response.status_code == 401
+    assert response['Content-Type'] == 'application/json'
+    assert 'detail' in response.json()
+    response = user_client.get(URL, HTTP_ACCEPT='image/png')
+    assert response.status_code == 406
+    assert response['Content-Type'] == 'application/json'
+
+    def broken_render(self, file):
+        raise ValueError('broken font')
+
+    monkeypatch.setattr(PDFExporter, 'render', broken_render)
+    user_client.raise_request_exception = False
+    response = user_client.get(URL)
+    # Ошибка сборки - до ответа, а не посреди потока с кодом 200.
+    assert response.status_code == 500
+    assert response['Content-Type'] != 'application/pdf'
+
+
+@pytest.mark.django_db
+def test_export_task_marks_failures(user, monkeypatch):
+    # Задача выгрузки, которой уже нет, не падает.
+    render_shopping_cart_export(0)
+    unknown = ShoppingCartExport.objects.create(
+        user=user, export_format='xls'
+    )
+    render_shopping_cart_export(unknown.pk)
+    unknown.refresh_from_db()
+    assert unknown.status == ShoppingCartExport.FAILED
+
+    def broken_list(user):
+        raise RuntimeError('database is gone')
+
+    monkeypatch.setattr(services, 'get_shopping_list', broken_list)
+    export = ShoppingCartExport.objects.create(
+        user=user, export_format='txt'
+    )
+    render_shopping_cart_export(export.pk)
+    export.refresh_from_db()
+    assert export.status == ShoppingCartExport.FAILED
+    assert not export.file
+
+
+def make_export(user, name: str, hours: int) -> ShoppingCartExport:
+    export = ShoppingCartExport.objects.create(
+        user=user, export_format='txt', status=ShoppingCartExport.DONE,
+    )
+    export.file.save(name, ContentFile(b'data'))
+    created = timezone.now() - timedelta(hours=hours)
+    ShoppingCartExport.objects.filter(pk=export.pk).update(created=created)
+    os.utime(
+        default_storage.path(export.file.name),
+        (created.timestamp(), created.timestamp()),
+    )
+    return export
+
+
+@pytest.mark.django_db
+def test_clean_exports(user):
+    old = make_export(user, 'old.txt', 48)
+    fresh = make_export(user, 'fresh.txt', 1)
+    orphan = default_storage.save('exports/orphan.txt', ContentFile(b'x'))
+    stale = timezone.now() - timedelta(hours=48)
+    os.utime(
+        default_storage.path(orphan), (stale.timestamp(), stale.timestamp())
+    )
+    call_command('clean_exports', '--dry-run', stdout=StringIO())
+    assert ShoppingCartExport.objects.count() == 2
+    assert default_storage.exists(orphan)
+    call_command('clean_exports', stdout=StringIO())
+    assert list(ShoppingCartExport.objects.all()) == [fresh]
+    assert not default_storage.exists(old.file.name)
+    assert not default_storage.exists(orphan)
+    assert default_storage.exists(fresh.file.name)
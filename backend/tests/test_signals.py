@@ -0,0 +1,121 @@
+"""Правки мимо API (админка, shell) сбрасывают те же кеши и индексы."""
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from recipes.caching import (
+    CART_VERSION_KEY, RECIPE_INGREDIENTS_VERSION_KEY, get_user_flags_version,
+    get_version
+)
+from recipes.models import (
+    COUNTER_FIELDS, Favorite, Recipe, RecipeIngredient, ShoppingCart
+)
+from recipes.search import search_recipe_ids
+
+
+def counters(model, recipes) -> list:
+    return [
+        getattr(Recipe.objects.get(pk=recipe.pk), COUNTER_FIELDS[model])
+        for recipe in recipes
+    ]
+
+
+@pytest.mark.django_db
+def test_link_signals(
+    user, other, recipes, django_capture_on_commit_callbacks
+):
+    cart_version = get_version(CART_VERSION_KEY.format(user_id=user.id))
+    flags_version = get_user_flags_version(user.id)
+    with django_capture_on_commit_callbacks(execute=True):
+        favorite = Favorite.objects.create(user=user, recipe=recipes[0])
+        ShoppingCart.objects.create(user=user, recipe=recipes[0])
+        ShoppingCart.objects.create(user=other, recipe=recipes[0])
+    assert counters(Favorite, recipes[:1]) == [1]
+    assert counters(ShoppingCart, recipes[:1]) == [2]
+    assert get_user_flags_version(user.id) != flags_version
+    assert get_version(
+        CART_VERSION_KEY.format(user_id=user.id)
+    ) != cart_version
+    favorite.recipe = recipes[1]
+    favorite.save()
+    assert counters(Favorite, recipes[:2]) == [0, 1]
+    favorite.save()
+    assert counters(Favorite, recipes[:2]) == [0, 1]
+    favorite.delete()
+    assert counters(Favorite, recipes[:2]) == [0, 0]
+    # Связи удаляются каскадом вместе с пользователем.
+    other.delete()
+    assert counters(ShoppingCart, recipes[:1]) == [1]
+
+
+@pytest.mark.django_db
+def test_repair_counters(user, other, recipes):
+    Favorite.objects.create(user=user, recipe=recipes[0])
+    Favorite.objects.create(user=other, recipe=recipes[0])
+    ShoppingCart.objects.create(user=user, recipe=recipes[1])
+    # Счётчики разошлись, например после правок напрямую в базе.
+    Recipe.objects.filter(pk=recipes[0].pk).update(
+        favorites_count=7, carts_count=3
+    )
+    Recipe.objects.filter(pk=recipes[1].pk).update(carts_count=0)
+    Recipe.objects.filter(pk=recipes[2].pk).update(favorites_count=5)
+    stdout = StringIO()
+    call_command('repair_counters', '--dry-run', stdout=stdout)
+    assert stdout.getvalue().splitlines() == [
+        'Разошлось favorites_count: 2', 'Разошлось carts_count: 2',
+    ]
+    assert counters(Favorite, recipes[:3]) == [7, 0, 5]
+    stdout = StringIO()
+    call_command('repair_counters', stdout=stdout)
+    assert stdout.getvalue().splitlines() == [
+        'Исправлено favorites_count: 2', 'Исправлено carts_count: 2',
+    ]
+    assert counters(Favorite, recipes) == [2] + [0] * 11
+    assert counters(ShoppingCart, recipes) == [0, 1] + [0] * 10
+    assert Recipe.objects.repair_counters(dry_run=True) == {
+        'favorites_count': 0, 'carts_count': 0,
+    }
+
+
+@pytest.mark.django_db
+def test_recipe_delete_with_drifted_counter(user, other, recipes):
+    Favorite.objects.create(user=other, recipe=recipes[0])
+    Recipe.objects.filter(pk=recipes[0].pk).update(favorites_count=0)
+    recipes[0].delete()
+    assert not Favorite.objects.exists()
+
+
+@pytest.mark.django_db
+def test_recipe_ingredient_signals(
+    user, recipes, ingredients, django_capture_on_commit_callbacks
+):
+    recipe = recipes[0]
+    ShoppingCart.objects.create(user=user, recipe=recipe)
+    cart_key = CART_VERSION_KEY.format(user_id=user.id)
+    cart_version = get_version(cart_key)
+    coverage_version = get_version(RECIPE_INGREDIENTS_VERSION_KEY)
+    assert recipe.pk not in search_recipe_ids('яйца')
+    with django_capture_on_commit_callbacks(execute=True):
+        RecipeIngredient.objects.create(
+            recipe=recipe, ingredient=ingredients[4], amount=2
+        )
+    assert Recipe.objects.get(pk=recipe.pk).updated_at > recipe.updated_at
+    assert recipe.pk in search_recipe_ids('яйца')
+    assert get_version(RECIPE_INGREDIENTS_VERSION_KEY) != coverage_version
+    assert get_version(cart_key) != cart_version
+    cart_version = get_version(cart_key)
+    with django_capture_on_commit_callbacks(execute=True):
+        RecipeIngredient.objects.get(
+            recipe=recipe, ingredient=ingredients[4]
+        ).delete()
+    assert recipe.pk not in search_recipe_ids('яйца')
+    assert get_version(cart_key) != cart_version
+
+
+@pytest.mark.django_db
+def test_recipe_save_reindexes(recipes):
+    recipe = recipes[0]
+    recipe.name = 'Шарлотка'
+    recipe.save()
+    assert search_recipe_ids('шарлотка') == [recipe.pk]
@@ -0,0 +1,54 @@
+import pytest
+
+from recipes.models import Recipe
+
+
+@pytest.fixture
+def authors(django_user_model, user, other, recipes):
+    """other и ещё три автора по три рецепта, user подписан на всех."""
+    authors = [other]
+    for number in range(3):
+        author = django_user_model.objects.create_user(
+            email=f'author{number}@example.com',
+            username=f'author{number}',
+            first_name='Автор',
+            last_name='Авторов',
+            password='secret-pass-123',
+        )
+        for index in range(3):
+            Recipe.objects.create(
+                author=author,
+                name=f'Рецепт {index}',
+                text='Описание',
+                cooking_time=10,
+            )
+        authors.append(author)
+    user.subscribes.add(*authors)
+    return authors
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('limit', (1, 4))
+def test_subscriptions_queries(
+    user_client, authors, django_assert_num_queries, limit
+):
+    # Подсчёт, авторы с recipes_count, рецепты всех авторов
+    # и подписки для is_subscribed.
+    for page_size in (1, 4):
+        with django_assert_num_queries(4):
+            response = user_client.get(
+                '/api/users/subscriptions/',
+                {'limit': page_size, 'recipes_limit': limit},
+            )
+        assert response.status_code == 200
+    results = response.json()['results']
+    assert [author['id'] for author in results] == sorted(
+        author.pk for author in authors
+    )
+    assert [author['recipes_count'] for author in results] == [6, 3, 3, 3]
+    assert [len(author['recipes']) for author in results] == [
+        min(limit, 6), min(limit, 3), min(limit, 3), min(limit, 3)
+    ]
+    assert results[0]['recipes'][0]['id'] == Recipe.objects.filter(
+        author=authors[0]
+    ).latest('pub_date', 'id').pk
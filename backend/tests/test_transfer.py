@@ -0,0 +1,119 @@
+import base64
+import io
+import json
+import os
+
+import pytest
+from django.conf import settings
+from PIL import Image
+
+from recipes.models import Recipe
+
+EXPORT_URL = '/api/recipes/export.ndjson'
+IMPORT_URL = '/api/recipes/bulk/'
+
+
+def export(client) -> list:
+    response = client.get(EXPORT_URL)
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'application/x-ndjson'
+    return [
+        json.loads(line)
+        for line in b''.join(response.streaming_content).splitlines()
+    ]
+
+
+def png_data_uri(color: str) -> str:
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), color).save(buffer, 'PNG')
+    return (
+        'data:image/png;base64,'
+        + base64.b64encode(buffer.getvalue()).decode()
+    )
+
+
+def post_ndjson(client, lines):
+    return client.post(
+        IMPORT_URL,
+        '\n'.join(
+            line if isinstance(line, str)
+            else json.dumps(line, ensure_ascii=False)
+            for line in lines
+        ).encode(),
+        content_type='application/x-ndjson',
+    )
+
+
+@pytest.mark.django_db
+def test_export_exact_url(staff_client, recipes):
+    lines = export(staff_client)
+    assert len(lines) == len(recipes)
+    assert lines[0] == {
+        'name': 'Рецепт 0',
+        'text': 'Описание',
+        'cooking_time': 10,
+        'author': 'cook@example.com',
+        'image': None,
+        'tags': ['breakfast', 'dinner'],
+        'ingredients': [
+            {'name': 'абрикосы', 'measurement_unit': 'г', 'amount': 1},
+            {'name': 'мука', 'measurement_unit': 'г', 'amount': 1},
+            {'name': 'соль', 'measurement_unit': 'г', 'amount': 1},
+        ],
+    }
+
+
+@pytest.mark.django_db
+def test_export_queries_per_chunk(
+    staff_client, recipes, django_assert_num_queries
+):
+    # Рецепты с авторами, теги и ингредиенты - на всю пачку.
+    with django_assert_num_queries(3):
+        export(staff_client)
+
+
+@pytest.mark.django_db
+def test_transfer_staff_only(user_client, recipes):
+    assert user_client.get(EXPORT_URL).status_code == 403
+    assert post_ndjson(user_client, ['{}']).status_code == 403
+
+
+@pytest.mark.django_db
+def test_import_roundtrip(staff_client, recipes):
+    lines = export(staff_client)
+    bad = dict(lines[0], tags=['unknown'], author='nobody@example.com')
+    response = post_ndjson(
+        staff_client, [lines[0], '{broken', bad, lines[1]]
+    )
+    assert response.status_code == 201
+    data = response.json()
+    assert [item['line'] for item in data['created']] == [1, 4]
+    assert [item['line'] for item in data['errors']] == [2, 3]
+    assert set(data['errors'][1]['errors']) == {'author', 'tags'}
+    copy = Recipe.objects.get(pk=data['created'][0]['id'])
+    assert copy.author.email == lines[0]['author']
+    assert copy.tags.count() == 2
+    assert copy.ingredients.count() == 3
+
+
+@pytest.mark.django_db
+def test_import_same_image_stored_once(staff_client, recipes):
+    line = dict(export(staff_client)[0], image=png_data_uri('red'))
+    response = post_ndjson(staff_client, [line, line])
+    assert response.status_code == 201
+    created = [item['id'] for item in response.json()['created']]
+    names = {
+        recipe.image.name
+        for recipe in Recipe.objects.filter(pk__in=created)
+    }
+    assert len(names) == 1
+    stored = [
+        name
+        for name in os.listdir(os.path.join(settings.MEDIA_ROOT, 'images'))
+        if name.endswith('.png')
+    ]
+    assert stored == [os.path.basename(names.pop())]
+    # Та же картинка в следующей загрузке ссылается на готовый файл.
+    response = post_ndjson(staff_client, [line])
+    recipe = Recipe.objects.get(pk=response.json()['created'][0]['id'])
+    assert recipe.image.name == Recipe.objects.get(pk=created[0]).image.name
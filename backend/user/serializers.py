@@ -6,12 +6,30 @@ from rest_framework import serializers, status
 from rest_framework.fields import SerializerMethodField
 from rest_framework.response import Response
 
+from recipes.fields import ThumbnailImageField
 from recipes.models import Recipe
 from .models import CustomUser
 
 logger = logging.getLogger(__name__)
 
 
+def get_subscribed_ids(request) -> set:
+    """
+    Id авторов, на которых подписан пользователь запроса.
+    Считается одним запросом и запоминается на request, поэтому
+    все вложенные сериализаторы пользователей делят одно множество.
+    """
+    if request is None or not request.user.is_authenticated:
+        return set()
+    subscribed_ids = getattr(request, '_subscribed_ids', None)
+    if subscribed_ids is None:
+        subscribed_ids = set(
+            request.user.subscribes.values_list('id', flat=True)
+        )
+        request._subscribed_ids = subscribed_ids
+    return subscribed_ids
+
+
 def check_new_password(data):
     return (
         data['current_password'] == data['new_password']
@@ -19,6 +37,8 @@ def check_new_password(data):
 
 
 class RecipeReadShortSerializer(serializers.ModelSerializer):
+    image = ThumbnailImageField(read_only=True)
+
     class Meta:
         model = Recipe
         fields = (
@@ -61,14 +81,15 @@ class SubscribtionsSerializer(serializers.ModelSerializer):
         )
 
     def get_recipes(self, obj):
-        recipes_limit = self.context.get(
-            'request',
-            None
-        ).get('recipes_limit', None)
-        logger.debug(obj)
-        recipes = obj.recipe.all()
-        if recipes_limit:
-            recipes = recipes[: int(recipes_limit)]
+        # В ленте подписок рецепты подгружены во вьюсете одним запросом.
+        recipes = getattr(obj, 'limited_recipes', None)
+        if recipes is None:
+            recipes_limit = self.context.get(
+                'request'
+            ).query_params.get('recipes_limit', None)
+            recipes = obj.recipe.all()
+            if recipes_limit:
+                recipes = recipes[: int(recipes_limit)]
         serializer = RecipeReadShortSerializer(
             recipes,
             many=True,
@@ -77,10 +98,13 @@ class SubscribtionsSerializer(serializers.ModelSerializer):
         return serializer.data
 
     def get_recipes_count(self, obj):
-        return obj.recipe.count()
+        recipes_count = getattr(obj, 'recipes_count', None)
+        if recipes_count is None:
+            return obj.recipe.count()
+        return recipes_count
 
     def get_is_subscribed(self, obj):
-        return False
+        return obj.id in get_subscribed_ids(self.context.get('request'))
 
     def validate(self, attrs):
         user = self.context['user']
@@ -113,7 +137,7 @@ class UserReadSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        return False
+        return obj.id in get_subscribed_ids(self.context.get('request'))
 
 
 class SetPasswordSerializer(serializers.Serializer):
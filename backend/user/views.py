@@ -1,5 +1,6 @@
 import logging
 
+from django.db.models import Count, Prefetch, prefetch_related_objects
 from django.shortcuts import get_object_or_404
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from djoser.views import UserViewSet
@@ -7,7 +8,10 @@ from rest_framework import permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from api.paginators import CustomPaginator
+from api.mixins import CursorPaginationMixin
+from api.paginators import CustomPaginator, IdKeysetPaginator
+from recipes.caching import bump_user_flags_version
+from recipes.models import Recipe
 from .models import CustomUser
 from .serializers import (
     SetPasswordSerializer,
@@ -17,7 +21,7 @@ from .serializers import (
 logger = logging.getLogger(__name__)
 
 
-class CustomUserViewSet(UserViewSet):
+class CustomUserViewSet(CursorPaginationMixin, UserViewSet):
     """
     Работа с пользователями приложения.
     Список пользователей и профиль доступны всем.
@@ -48,25 +52,50 @@ class CustomUserViewSet(UserViewSet):
             return SetPasswordSerializer
         return UserSerializer
 
+    def _prefetch_recipes(self, authors, query_params) -> None:
+        """
+        Рецепты всех авторов страницы одним запросом,
+        с учётом recipes_limit.
+        """
+        recipes = Recipe.objects.order_by('-pub_date', '-id')
+        try:
+            recipes_limit = int(query_params['recipes_limit'])
+        except (KeyError, ValueError):
+            recipes_limit = None
+        if recipes_limit is not None:
+            recipes = recipes.latest_per_author(
+                [author.id for author in authors],
+                recipes_limit,
+            )
+        prefetch_related_objects(
+            authors,
+            Prefetch('recipe', queryset=recipes, to_attr='limited_recipes'),
+        )
+
     @action(
         detail=False,
         methods=['GET'],
         permission_classes=(permissions.IsAuthenticated, ),
         url_path='subscriptions',
         pagination_class=CustomPaginator,
+        cursor_pagination_class=IdKeysetPaginator,
     )
     def subscriptions(self, request, *args, **kwargs):
         """
         [GET] - Возвращает пользователей, на которых подписан текущий юзер.
         В выдачу добавляются рецепты.
+        ?pagination=cursor - курсорная пагинация по id.
         """
-        subscribes = self.request.user.subscribes.all()
+        subscribes = self.request.user.subscribes.annotate(
+            recipes_count=Count('recipe'),
+        ).order_by('id')
         page = self.paginate_queryset(subscribes)
+        self._prefetch_recipes(page, request.query_params)
 
         serializer = SubscribtionsSerializer(
             page,
             many=True,
-            context={"request": request.query_params},
+            context={"request": request},
         )
         return self.get_paginated_response(serializer.data)
 
@@ -90,12 +119,13 @@ class CustomUserViewSet(UserViewSet):
             serializer = SubscribtionsSerializer(
                 sub_user,
                 context={
-                    'request': request.query_params,
+                    'request': request,
                     'user': user,
                     'sub_user': sub_user,
                 },
             )
             user.subscribes.add(sub_user)
+            bump_user_flags_version(user.id)
             return Response(
                 serializer.data,
                 status=status.HTTP_201_CREATED,
@@ -104,4 +134,5 @@ class CustomUserViewSet(UserViewSet):
         if sub_user not in user.subscribes.all():
             return Response(status=status.HTTP_400_BAD_REQUEST)
         user.subscribes.remove(sub_user)
+        bump_user_flags_version(user.id)
         return Response(status=status.HTTP_204_NO_CONTENT)